@@ -1,90 +1,102 @@
 import asyncio
 from pyrogram import Client
-from pyrogram.errors import FloodWait, PeerFlood, UserPrivacyRestricted, ChatWriteForbidden
+from pyrogram.errors import FloodWait, SlowmodeWait
 import time
+from config import BROADCAST_LOG_LIMIT
+from target_scheduler import TargetQueue
+from job_scheduler import BroadcastScheduler, PRIORITY_NORMAL
+from records import SendError
+from dialogs import iter_groups
 
 class BroadcastManager:
-    def __init__(self, session_manager):
+    def __init__(self, session_manager, clock=time.time, sleep=asyncio.sleep):
         self.session_manager = session_manager
+        # Engine time, replay swaps in a faster clock so recorded waits don't take wall-clock time
+        self.clock = clock
+        self.sleep = sleep
         self.broadcast_logs = {}
+        self.recorder = None  # optional Recorder wrapping the clients used for sends
+        self.scheduler = BroadcastScheduler(self)
         
-    async def broadcast_to_groups(self, message_text, parse_mode="markdown"):
+    def get_clients(self):
+        """Get the live session clients, wrapped for recording if enabled"""
+        sessions = self.session_manager.get_all_sessions()
+        if self.recorder:
+            return self.recorder.wrap_sessions(sessions)
+        return sessions
+        
+    async def broadcast_to_groups(self, message_text, parse_mode="markdown", priority=PRIORITY_NORMAL):
         """Broadcast message to all groups of all active sessions"""
-        all_results = {}
+        job = self.scheduler.submit(message_text, parse_mode, priority)
+        all_results = await job.done
         
-        for phone_number, client in self.session_manager.get_all_sessions().items():
-            try:
-                results = await self._broadcast_to_session_groups(client, message_text, parse_mode)
-                all_results[phone_number] = results
-                self.session_manager.update_last_broadcast(phone_number)
-            except Exception as e:
-                all_results[phone_number] = {"error": str(e)}
+        # Persist the usage times finish_account set, so a restart doesn't expire busy accounts
+        if all_results:
+            await self.session_manager.save_session_data()
                 
-        # Save broadcast logs
+        # Save broadcast logs, keeping only the most recent runs
         timestamp = time.time()
         self.broadcast_logs[timestamp] = all_results
-        
+        while len(self.broadcast_logs) > BROADCAST_LOG_LIMIT:
+            del self.broadcast_logs[next(iter(self.broadcast_logs))]
+            
         return all_results
         
-    async def _broadcast_to_session_groups(self, client, message_text, parse_mode):
-        """Broadcast message to groups of a specific session with improved accuracy"""
-        results = {
-            "success": 0,
-            "failed": 0,
-            "errors": []
-        }
+    def finish_account(self, phone_number, results):
+        """Update session metadata once an account finished a broadcast"""
+        if results.error is None:
+            self.session_manager.update_last_broadcast(phone_number)
+            self.session_manager.update_session_usage(phone_number)
+            
+    async def _send_to_chat(self, client, chat_id, message_text, parse_mode):
+        """Send the message to one chat, waiting out a single flood wait"""
+        try:
+            await client.send_message(
+                chat_id=chat_id,
+                text=message_text,
+                parse_mode=parse_mode
+            )
+        except FloodWait as e:
+            # Wait for the specified time before retrying
+            await self.sleep(e.value)
+            await client.send_message(
+                chat_id=chat_id,
+                text=message_text,
+                parse_mode=parse_mode
+            )
+            
+    async def prepare_account(self, phone_number, client):
+        """Refresh the group index of an account and order its targets, ready chats first"""
+        groups = [group async for group in iter_groups(client)]
+        group_index = self.session_manager.set_group_index(phone_number, groups)
+        return group_index, TargetQueue(groups, self.clock())
+        
+    async def deliver(self, client, run, chat_id):
+        """Send a job's message to one chat and record the outcome"""
+        job = run.job
+        results = run.result
+        group = run.group_index[chat_id]
         
+        # Skip chats where the account cannot send messages, known from the dialogs
+        if not group.can_send_messages:
+            results.record_failure(SendError.CANNOT_SEND, chat_id)
+            return
+            
         try:
-            async for dialog in client.get_dialogs():
-                # Check if it's a group or supergroup
-                if dialog.chat and dialog.chat.type in ["group", "supergroup"]:
-                    # Check if bot is admin in the group and can send messages
-                    try:
-                        bot_member = await client.get_chat_member(dialog.chat.id, "me")
-                        is_admin = bot_member.status in ["administrator", "creator"]
-                        can_send_messages = getattr(bot_member, 'can_send_messages', True)
-                        
-                        # Skip if bot cannot send messages
-                        if not can_send_messages:
-                            results["failed"] += 1
-                            results["errors"].append(f"{dialog.chat.title}: Cannot send messages")
-                            continue
-                    except:
-                        # If we can't get bot member status, assume we can send messages
-                        pass
-                    
-                    try:
-                        await client.send_message(
-                            chat_id=dialog.chat.id,
-                            text=message_text,
-                            parse_mode=parse_mode
-                        )
-                        results["success"] += 1
-                    except FloodWait as e:
-                        # Wait for the specified time before retrying
-                        await asyncio.sleep(e.value)
-                        try:
-                            await client.send_message(
-                                chat_id=dialog.chat.id,
-                                text=message_text,
-                                parse_mode=parse_mode
-                            )
-                            results["success"] += 1
-                        except Exception as e2:
-                            results["failed"] += 1
-                            results["errors"].append(f"{dialog.chat.title}: {str(e2)}")
-                    except (PeerFlood, UserPrivacyRestricted, ChatWriteForbidden) as e:
-                        results["failed"] += 1
-                        results["errors"].append(f"{dialog.chat.title}: {str(e)}")
-                    except Exception as e:
-                        results["failed"] += 1
-                        results["errors"].append(f"{dialog.chat.title}: {str(e)}")
-                        
+            await self._send_to_chat(client, chat_id, job.message_text, job.parse_mode)
+            group.last_post_at = self.clock()
+            results.record_success()
+        except SlowmodeWait as e:
+            # Remember the cooldown and try the chat again at the end of the run
+            group.slow_mode_delay = max(group.slow_mode_delay, e.value)
+            if chat_id in run.deferred_once:
+                results.record_failure(SendError.SLOW_MODE, chat_id)
+            else:
+                run.deferred_once.add(chat_id)
+                run.queue.defer(chat_id, self.clock() + e.value)
         except Exception as e:
-            results["error"] = str(e)
+            results.record_failure(SendError.classify(e), chat_id)
             
-        return results
-        
     def get_broadcast_logs(self):
         """Get broadcast logs"""
         return self.broadcast_logs
@@ -93,31 +105,15 @@ class BroadcastManager:
         """Get list of groups for a client with detailed information"""
         groups = []
         try:
-            async for dialog in client.get_dialogs():
-                # Check if it's a group or supergroup
-                if dialog.chat and dialog.chat.type in ["group", "supergroup"]:
-                    # Get additional group information
+            async for group in iter_groups(client):
+                # Only look up the member count when the dialog didn't carry it
+                if group.member_count is None:
                     try:
-                        # Get chat member count
-                        member_count = await client.get_chat_members_count(dialog.chat.id)
+                        group.member_count = await client.get_chat_members_count(group.id)
                     except:
-                        member_count = "Unknown"
-                    
-                    # Check if bot is admin in the group
-                    try:
-                        bot_member = await client.get_chat_member(dialog.chat.id, "me")
-                        is_admin = bot_member.status in ["administrator", "creator"]
-                    except:
-                        is_admin = False
+                        pass
                     
-                    groups.append({
-                        "id": dialog.chat.id,
-                        "title": dialog.chat.title,
-                        "type": dialog.chat.type,
-                        "member_count": member_count,
-                        "is_admin": is_admin,
-                        "username": getattr(dialog.chat, 'username', None)
-                    })
+                groups.append(group)
         except Exception as e:
             print(f"Error getting group list: {e}")
             pass
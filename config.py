@@ -19,8 +19,56 @@ SESSION_DIR = 'sessions'
 RATE_LIMIT_WINDOW = 60  # seconds
 MAX_COMMANDS_PER_WINDOW = 10
 
+# Token cost per command, heavy commands drain the rate limit faster
+COMMAND_COSTS = {
+    'broadcast': 5,
+    'scan': 3,
+    'left': 3,
+    'clearall': 2,
+    'status': 0.5,
+}
+DEFAULT_COMMAND_COST = 1
+
 # Session expiry settings
 SESSION_EXPIRY_HOURS = 24
+SESSION_STOP_TIMEOUT = 10  # seconds to wait for a client to stop
+SESSION_START_CONCURRENCY = 10  # saved sessions started at once on boot
+SESSION_START_TIMEOUT = 30  # seconds to connect one saved session on boot
+PENDING_LOGIN_TTL = 600  # seconds before an unfinished login is dropped
+
+# Bulk session import settings
+IMPORT_CONCURRENCY = 10  # session strings validated at once
+IMPORT_TIMEOUT = 30  # seconds to connect and validate one session
+IMPORT_MAX_FILE_SIZE = 1024 * 1024  # bytes
+
+# Connection watchdog settings
+WATCHDOG_INTERVAL = int(os.getenv('WATCHDOG_INTERVAL', '60'))  # seconds between pings
+WATCHDOG_PING_TIMEOUT = 10  # seconds before a ping or reconnect attempt fails
+WATCHDOG_CONCURRENCY = 20  # clients pinged at once
+WATCHDOG_BACKOFF_BASE = 2  # seconds, doubled per failed reconnect
+WATCHDOG_BACKOFF_MAX = 300
+
+# Longest wait (seconds) for slow mode chats deferred to the end of a broadcast
+BROADCAST_MAX_COOLDOWN_WAIT = 300
+
+# Minimum seconds between two sends of the same account, shared by all jobs
+ACCOUNT_SEND_INTERVAL = 0
+
+# Number of recent job wait times kept for /jobs
+JOB_WAIT_HISTORY = 50
+
+# Number of broadcast runs kept in memory
+BROADCAST_LOG_LIMIT = 50
+
+# Dialogs fetched per request when listing groups (Telegram allows at most 100)
+DIALOG_PAGE_SIZE = 100
+
+# Report settings, Telegram rejects messages over 4096 UTF-16 code units
+REPORT_PAGE_LIMIT = 4000
+REPORT_CACHE_SIZE = 20  # reports kept for inline pagination
+
+# Directory for broadcast traffic recordings, recording is off when unset
+RECORD_DIR = os.getenv('RECORD_DIR')
 
 # Default values
 DEFAULT_PARSE_MODE = 'markdown'
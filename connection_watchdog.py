@@ -0,0 +1,89 @@
+import random
+import asyncio
+from pyrogram import raw
+from pyrogram.errors import Unauthorized, AuthKeyUnregistered
+from config import (
+    WATCHDOG_INTERVAL, WATCHDOG_PING_TIMEOUT, WATCHDOG_CONCURRENCY,
+    WATCHDOG_BACKOFF_BASE, WATCHDOG_BACKOFF_MAX
+)
+
+class ConnectionWatchdog:
+    """Pings every user client and keeps broadcasts on clients known to be live"""
+
+    def __init__(self, session_manager, interval=WATCHDOG_INTERVAL):
+        self.session_manager = session_manager
+        self.interval = interval
+        self.reconnecting = {}  # phone_number -> reconnect task
+
+    async def ping(self, client):
+        """Make the cheapest authorized request, raising if the client is not usable"""
+        await asyncio.wait_for(client.invoke(raw.functions.updates.GetState()), WATCHDOG_PING_TIMEOUT)
+
+    async def run(self):
+        """Check all clients every interval"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check_all()
+            except Exception as e:
+                print(f"Error checking connections: {e}")
+
+    async def check_all(self):
+        """Ping every started client that is not already reconnecting or revoked"""
+        semaphore = asyncio.Semaphore(WATCHDOG_CONCURRENCY)
+        targets = [
+            (phone_number, client)
+            for phone_number, client in list(self.session_manager.sessions.items())
+            if phone_number not in self.reconnecting and phone_number not in self.session_manager.revoked
+        ]
+        await asyncio.gather(*(self._check(phone_number, client, semaphore) for phone_number, client in targets))
+
+    async def _check(self, phone_number, client, semaphore):
+        async with semaphore:
+            try:
+                await self.ping(client)
+                self.session_manager.mark_healthy(phone_number)
+            except Unauthorized as e:
+                print(f"Session {phone_number} was revoked: {e}")
+                await self.session_manager.mark_revoked(phone_number)
+            except Exception as e:
+                print(f"Session {phone_number} lost its connection: {e}")
+                self.session_manager.mark_unhealthy(phone_number)
+                self._start_reconnect(phone_number, client)
+
+    def _start_reconnect(self, phone_number, client):
+        task = asyncio.create_task(self._reconnect(phone_number, client))
+        self.reconnecting[phone_number] = task
+        task.add_done_callback(lambda _: self.reconnecting.pop(phone_number, None))
+
+    async def _restart(self, client):
+        """Reconnect a client without the interactive login start() would fall back to"""
+        if client.is_initialized:
+            await client.stop()
+        elif client.is_connected:
+            await client.disconnect()
+        if not await client.connect():
+            await client.disconnect()
+            raise AuthKeyUnregistered()
+        await client.initialize()
+
+    async def _reconnect(self, phone_number, client):
+        """Reconnect at once, then back off exponentially with full jitter"""
+        attempt = 0
+        while self.session_manager.sessions.get(phone_number) is client:
+            if attempt:
+                cap = min(WATCHDOG_BACKOFF_MAX, WATCHDOG_BACKOFF_BASE * 2 ** (attempt - 1))
+                await asyncio.sleep(random.uniform(0, cap))
+            attempt += 1
+            try:
+                await asyncio.wait_for(self._restart(client), WATCHDOG_PING_TIMEOUT)
+                await self.ping(client)
+                self.session_manager.mark_healthy(phone_number)
+                print(f"Session {phone_number} reconnected after {attempt} attempt(s)")
+                return
+            except Unauthorized as e:
+                print(f"Session {phone_number} was revoked: {e}")
+                await self.session_manager.mark_revoked(phone_number)
+                return
+            except Exception as e:
+                print(f"Reconnecting {phone_number} failed: {e}")
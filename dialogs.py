@@ -0,0 +1,110 @@
+from pyrogram import Client, raw, utils
+from config import DIALOG_PAGE_SIZE
+from records import GroupInfo
+
+def iter_groups(client):
+    """Iterate over the groups of an account as GroupInfo records.
+
+    Pyrogram clients are read page by page with raw GetDialogs, whose dialogs
+    carry the notify settings, the account's rights and usually the member
+    count, so no call is made per chat. Wrappers and fakes provide their own
+    iter_groups.
+    """
+    if isinstance(client, Client):
+        return _iter_raw_groups(client)
+    return client.iter_groups()
+
+def _can_send(chat):
+    """Check whether the account may post in a raw chat"""
+    if chat.creator or chat.admin_rights:
+        return True
+    for rights in (getattr(chat, 'banned_rights', None), chat.default_banned_rights):
+        if rights is not None and rights.send_messages:
+            return False
+    return True
+
+def group_from_dialog(dialog, chat):
+    """Build a GroupInfo from a raw dialog and its chat, None if it isn't a usable group"""
+    if isinstance(chat, raw.types.Chat):
+        if chat.left or chat.deactivated or chat.migrated_to:
+            return None
+        chat_type = "group"
+    elif isinstance(chat, raw.types.Channel):
+        if chat.left or not chat.megagroup:
+            return None
+        chat_type = "supergroup"
+    else:
+        return None
+
+    return GroupInfo(
+        id=utils.get_peer_id(dialog.peer),
+        title=chat.title,
+        type=chat_type,
+        username=getattr(chat, 'username', None),
+        member_count=chat.participants_count,
+        is_admin=bool(chat.creator or chat.admin_rights),
+        can_send_messages=_can_send(chat),
+        muted_until=dialog.notify_settings.mute_until or 0
+    )
+
+def _input_peer(peer, users, chats):
+    """Build the offset peer of the next dialogs page"""
+    if isinstance(peer, raw.types.PeerUser):
+        user = users.get(peer.user_id)
+        return raw.types.InputPeerUser(user_id=peer.user_id, access_hash=getattr(user, 'access_hash', None) or 0)
+    if isinstance(peer, raw.types.PeerChat):
+        return raw.types.InputPeerChat(chat_id=peer.chat_id)
+    channel = chats.get(peer.channel_id)
+    return raw.types.InputPeerChannel(channel_id=peer.channel_id, access_hash=getattr(channel, 'access_hash', None) or 0)
+
+async def _iter_raw_groups(client):
+    offset_date, offset_id, offset_peer = 0, 0, raw.types.InputPeerEmpty()
+    seen = set()
+    while True:
+        page = await client.invoke(
+            raw.functions.messages.GetDialogs(
+                offset_date=offset_date,
+                offset_id=offset_id,
+                offset_peer=offset_peer,
+                limit=DIALOG_PAGE_SIZE,
+                hash=0
+            ),
+            sleep_threshold=60
+        )
+        if isinstance(page, raw.types.messages.DialogsNotModified):
+            return
+
+        users = {user.id: user for user in page.users}
+        chats = {chat.id: chat for chat in page.chats}
+        dialogs = [dialog for dialog in page.dialogs if isinstance(dialog, raw.types.Dialog)]
+        for dialog in dialogs:
+            peer = dialog.peer
+            if isinstance(peer, raw.types.PeerChat):
+                chat = chats.get(peer.chat_id)
+            elif isinstance(peer, raw.types.PeerChannel):
+                chat = chats.get(peer.channel_id)
+            else:
+                continue
+            group = group_from_dialog(dialog, chat)
+            if group is not None and group.id not in seen:
+                seen.add(group.id)
+                yield group
+
+        # A full Dialogs result holds everything, a slice needs the next page
+        if not dialogs or isinstance(page, raw.types.messages.Dialogs):
+            return
+        last = dialogs[-1]
+        last_peer_id = utils.get_peer_id(last.peer)
+        top_message = next(
+            (
+                message for message in page.messages
+                if message.id == last.top_message
+                and not isinstance(message, raw.types.MessageEmpty)
+                and utils.get_peer_id(message.peer_id) == last_peer_id
+            ),
+            None
+        )
+        if top_message is None or (top_message.date, top_message.id) == (offset_date, offset_id):
+            return
+        offset_date, offset_id = top_message.date, top_message.id
+        offset_peer = _input_peer(last.peer, users, chats)
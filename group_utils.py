@@ -1,116 +1,107 @@
 import asyncio
 from pyrogram import Client
 from pyrogram.errors import FloodWait
+from records import SendError, AccountResult
+from dialogs import iter_groups
 
 class GroupManager:
     def __init__(self, session_manager):
         self.session_manager = session_manager
+        self.recorder = None  # optional Recorder wrapping the clients used here
+        
+    def get_clients(self):
+        """Get the live session clients, wrapped for recording if enabled"""
+        sessions = self.session_manager.get_all_sessions()
+        if self.recorder:
+            return self.recorder.wrap_sessions(sessions)
+        return sessions
+        
+    async def index_groups(self, phone_number, client, save=True):
+        """Rebuild the group index and group count of a session from its dialogs"""
+        try:
+            groups = [group async for group in iter_groups(client)]
+        except Exception as e:
+            print(f"Error indexing groups for {phone_number}: {e}")
+            return
+        self.session_manager.set_group_index(phone_number, groups)
+        await self.session_manager.update_session_groups(phone_number, len(groups), save=save)
         
     async def leave_muted_groups(self):
         """Leave groups marked as read-only or muted"""
         all_results = {}
         
-        for phone_number, client in self.session_manager.get_all_sessions().items():
+        for phone_number, client in self.get_clients().items():
             try:
-                results = await self._leave_muted_groups_for_session(client)
+                results = await self._leave_muted_groups_for_session(phone_number, client)
                 all_results[phone_number] = results
+                self.session_manager.update_session_usage(phone_number)
             except Exception as e:
-                all_results[phone_number] = {"error": str(e)}
+                results = AccountResult()
+                results.error = str(e)
+                all_results[phone_number] = results
                 
+        # One write for the usage times of every account
+        if all_results:
+            await self.session_manager.save_session_data()
         return all_results
         
-    async def _leave_muted_groups_for_session(self, client):
-        """Leave muted groups for a specific session with improved accuracy"""
-        results = {
-            "left": 0,
-            "failed": 0,
-            "errors": []
-        }
+    async def _leave_chat(self, client, chat_id):
+        """Leave one chat, waiting out a single flood wait"""
+        try:
+            await client.leave_chat(chat_id)
+        except FloodWait as e:
+            # Wait for the specified time before retrying
+            await asyncio.sleep(e.value)
+            await client.leave_chat(chat_id)
+            
+    async def _leave_muted_groups_for_session(self, phone_number, client):
+        """Leave muted groups for a specific session.
+        
+        Mute state and send rights come with the dialog pages, so the only
+        calls made per chat are the leaves themselves.
+        """
+        results = AccountResult()
         
         try:
-            async for dialog in client.get_dialogs():
-                if dialog.chat and dialog.chat.type in ["group", "supergroup"]:
-                    # Check if group is muted or read-only
-                    try:
-                        # Check notification settings
-                        notifications = getattr(dialog.chat, 'notifications', None)
-                        # Check if group is read-only
-                        try:
-                            bot_member = await client.get_chat_member(dialog.chat.id, "me")
-                            is_admin = bot_member.status in ["administrator", "creator"]
-                            can_send_messages = getattr(bot_member, 'can_send_messages', True)
-                        except:
-                            is_admin = False
-                            can_send_messages = True
-                        
-                        # Leave group if it's muted or read-only
-                        if (notifications is not None and not notifications) or not can_send_messages:
-                            try:
-                                await client.leave_chat(dialog.chat.id)
-                                results["left"] += 1
-                            except FloodWait as e:
-                                # Wait for the specified time before retrying
-                                await asyncio.sleep(e.value)
-                                try:
-                                    await client.leave_chat(dialog.chat.id)
-                                    results["left"] += 1
-                                except Exception as e2:
-                                    results["failed"] += 1
-                                    results["errors"].append(f"{dialog.chat.title}: {str(e2)}")
-                            except Exception as e:
-                                results["failed"] += 1
-                                results["errors"].append(f"{dialog.chat.title}: {str(e)}")
-                    except Exception as e:
-                        results["failed"] += 1
-                        results["errors"].append(f"{dialog.chat.title}: {str(e)}")
-                        
+            groups = [group async for group in iter_groups(client)]
         except Exception as e:
-            results["error"] = str(e)
+            results.error = str(e)
+            return results
             
+        kept = []
+        for group in groups:
+            # Keep groups that are neither muted nor read-only
+            if not group.muted and group.can_send_messages:
+                kept.append(group)
+                continue
+            try:
+                await self._leave_chat(client, group.id)
+                results.record_success()
+            except Exception as e:
+                results.record_failure(SendError.classify(e), group.id)
+                kept.append(group)
+                
+        self.session_manager.set_group_index(phone_number, kept)
         return results
         
-    async def get_group_status(self, client):
-        """Get detailed status of groups (muted, read-only, etc.)"""
+    async def get_group_status(self, client, phone_number=None):
+        """Get detailed status of groups (muted, read-only, etc.)
+        
+        Passing the phone number also refreshes the cached group index.
+        """
         groups = []
         try:
-            async for dialog in client.get_dialogs():
-                if dialog.chat and dialog.chat.type in ["group", "supergroup"]:
-                    # Get additional group information
-                    try:
-                        # Get chat member count
-                        member_count = await client.get_chat_members_count(dialog.chat.id)
-                    except:
-                        member_count = "Unknown"
-                    
-                    # Check if bot is admin in the group
-                    try:
-                        bot_member = await client.get_chat_member(dialog.chat.id, "me")
-                        is_admin = bot_member.status in ["administrator", "creator"]
-                        # Check if bot can send messages
-                        can_send_messages = getattr(bot_member, 'can_send_messages', True)
-                    except:
-                        is_admin = False
-                        can_send_messages = False
-                    
-                    # Check notification settings
+            async for group in iter_groups(client):
+                # Only look up the member count when the dialog didn't carry it
+                if group.member_count is None:
                     try:
-                        # This is a simplified check - in reality, you'd want to check
-                        # actual notification settings
-                        notifications = "enabled" if dialog.chat.notifications else "disabled"
+                        group.member_count = await client.get_chat_members_count(group.id)
                     except:
-                        notifications = "unknown"
-                    
-                    groups.append({
-                        "id": dialog.chat.id,
-                        "title": dialog.chat.title,
-                        "type": dialog.chat.type,
-                        "member_count": member_count,
-                        "is_admin": is_admin,
-                        "can_send_messages": can_send_messages,
-                        "notifications": notifications,
-                        "username": getattr(dialog.chat, 'username', None)
-                    })
+                        pass
+                groups.append(group)
         except Exception as e:
             print(f"Error getting group status: {e}")
-            pass
+            return groups
+        if phone_number is not None:
+            self.session_manager.set_group_index(phone_number, groups)
         return groups
@@ -0,0 +1,238 @@
+import time
+import asyncio
+import itertools
+from collections import deque
+from config import ACCOUNT_SEND_INTERVAL, BROADCAST_MAX_COOLDOWN_WAIT, JOB_WAIT_HISTORY
+from records import SendError, AccountResult
+
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 1
+PRIORITY_NAMES = {PRIORITY_URGENT: "urgent", PRIORITY_NORMAL: "normal"}
+
+class BroadcastJob:
+    """One /broadcast request spread over every account"""
+
+    def __init__(self, job_id, message_text, parse_mode, priority):
+        self.id = job_id
+        self.message_text = message_text
+        self.parse_mode = parse_mode
+        self.priority = priority
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.results = {}  # phone_number -> AccountResult
+        self.pending = set()  # phone numbers still sending
+        self.done = asyncio.get_running_loop().create_future()
+
+    @property
+    def wait_time(self):
+        """Seconds between submission and the first send, so far if not started"""
+        return (self.started_at or time.time()) - self.submitted_at
+
+    @property
+    def sent(self):
+        return sum(result.success + result.failed for result in self.results.values())
+
+class AccountRun:
+    """Progress of one job on one account"""
+
+    def __init__(self, job, phone_number):
+        self.job = job
+        self.phone_number = phone_number
+        self.result = AccountResult()
+        self.group_index = None
+        self.queue = None  # TargetQueue, built when the account first picks the job up
+        self.deferred_once = set()
+        self.sleeping_until = 0  # epoch time the next deferred chat becomes ready
+
+class AccountWorker:
+    """Owns the send capacity of one account and shares it between jobs.
+
+    Every iteration sends to a single chat. The highest priority with work
+    ready wins, and jobs of equal priority take turns, so an urgent job
+    pre-empts a routine one at the next chat and concurrent routine jobs
+    split the account's sends evenly.
+    """
+
+    def __init__(self, scheduler, phone_number, client):
+        self.scheduler = scheduler
+        self.phone_number = phone_number
+        self.client = client
+        self.runs = {}  # priority -> deque of AccountRun
+        self.wakeup = asyncio.Event()
+        self.next_send_at = 0
+        self.task = None
+
+    def add(self, run):
+        self.runs.setdefault(run.job.priority, deque()).append(run)
+        self.wakeup.set()
+
+    def queue_depth(self):
+        return sum(len(ring) for ring in self.runs.values())
+
+    def _pick(self, now):
+        """Get the next run with a chat ready, or None and the earliest wake time"""
+        earliest = None
+        for priority in sorted(self.runs):
+            ring = self.runs[priority]
+            for _ in range(len(ring)):
+                run = ring[0]
+                ring.rotate(-1)
+                if run.sleeping_until <= now:
+                    return run, None
+                earliest = run.sleeping_until if earliest is None else min(earliest, run.sleeping_until)
+        return None, earliest
+
+    def _finish(self, run):
+        ring = self.runs[run.job.priority]
+        ring.remove(run)
+        if not ring:
+            del self.runs[run.job.priority]
+        self.scheduler.finish_run(run)
+
+    async def _wait(self, timeout):
+        """Sleep on the scheduler's clock until timeout or a new job arrives"""
+        waiters = [
+            asyncio.ensure_future(self.wakeup.wait()),
+            asyncio.ensure_future(self.scheduler.sleep(timeout))
+        ]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def run(self):
+        """Send for queued jobs until none are left"""
+        broadcast_manager = self.scheduler.broadcast_manager
+        clock = self.scheduler.clock
+        while self.runs:
+            self.wakeup.clear()
+            now = clock()
+            run, earliest = self._pick(now)
+            if run is None:
+                # Every job on this account is waiting for a chat to leave cooldown
+                await self._wait(earliest - now)
+                continue
+
+            if run.queue is None:
+                try:
+                    run.group_index, run.queue = await broadcast_manager.prepare_account(
+                        self.phone_number, self.client
+                    )
+                except Exception as e:
+                    run.result.error = str(e)
+                    self._finish(run)
+                continue
+
+            chat_id = run.queue.pop(now)
+            if chat_id is None:
+                if not run.queue:
+                    self._finish(run)
+                    continue
+                ready_at = run.queue.next_ready_at()
+                if ready_at - now > BROADCAST_MAX_COOLDOWN_WAIT:
+                    for chat_id in run.queue.drain():
+                        run.result.record_failure(SendError.SLOW_MODE, chat_id)
+                    self._finish(run)
+                else:
+                    run.sleeping_until = ready_at
+                continue
+
+            # Stay within the account's send rate
+            delay = self.next_send_at - clock()
+            if delay > 0:
+                await self.scheduler.sleep(delay)
+            self.scheduler.mark_started(run.job)
+            await broadcast_manager.deliver(self.client, run, chat_id)
+            self.next_send_at = clock() + ACCOUNT_SEND_INTERVAL
+
+class BroadcastScheduler:
+    """Queues broadcast jobs and runs them on one worker per account"""
+
+    def __init__(self, broadcast_manager):
+        self.broadcast_manager = broadcast_manager
+        self.session_manager = broadcast_manager.session_manager
+        self.clock = broadcast_manager.clock  # for cooldowns and pacing, job stats use real time
+        self.sleep = broadcast_manager.sleep
+        self.workers = {}  # phone_number -> AccountWorker
+        self.jobs = {}  # job_id -> BroadcastJob, active only
+        self.ids = itertools.count(1)
+        self.wait_times = deque(maxlen=JOB_WAIT_HISTORY)
+
+    def submit(self, message_text, parse_mode="markdown", priority=PRIORITY_NORMAL):
+        """Queue a broadcast on every active session and return the job"""
+        job = BroadcastJob(next(self.ids), message_text, parse_mode, priority)
+        sessions = self.broadcast_manager.get_clients()
+        if not sessions:
+            job.done.set_result(job.results)
+            return job
+
+        self.jobs[job.id] = job
+        for phone_number, client in sessions.items():
+            run = AccountRun(job, phone_number)
+            job.results[phone_number] = run.result
+            job.pending.add(phone_number)
+            self._worker_for(phone_number, client).add(run)
+        return job
+
+    def _worker_for(self, phone_number, client):
+        """Get the worker of an account, starting it if needed"""
+        worker = self.workers.get(phone_number)
+        if worker is None or worker.client is not client:
+            worker = AccountWorker(self, phone_number, client)
+            self.workers[phone_number] = worker
+        if worker.task is None or worker.task.done():
+            worker.task = asyncio.create_task(self._run_worker(worker))
+        return worker
+
+    async def _run_worker(self, worker):
+        try:
+            await worker.run()
+        except Exception as e:
+            # Finish the worker's runs so no broadcast waits forever on this account
+            print(f"Broadcast worker for {worker.phone_number} failed: {e!r}")
+            for ring in worker.runs.values():
+                for run in ring:
+                    run.result.error = f"Worker failed: {e}"
+                    self.finish_run(run)
+            worker.runs.clear()
+        finally:
+            if self.workers.get(worker.phone_number) is worker and not worker.runs:
+                del self.workers[worker.phone_number]
+
+    def mark_started(self, job):
+        if job.started_at is None:
+            job.started_at = time.time()
+            self.wait_times.append(job.wait_time)
+
+    def finish_run(self, run):
+        """Record that an account finished a job"""
+        job = run.job
+        job.pending.discard(run.phone_number)
+        self.broadcast_manager.finish_account(run.phone_number, run.result)
+        if not job.pending:
+            del self.jobs[job.id]
+            if not job.done.done():
+                job.done.set_result(job.results)
+
+    def get_stats(self):
+        """Get queue depth and wait times for /jobs"""
+        return {
+            "jobs": [
+                {
+                    "id": job.id,
+                    "priority": PRIORITY_NAMES.get(job.priority, str(job.priority)),
+                    "started": job.started_at is not None,
+                    "wait_time": job.wait_time,
+                    "sent": job.sent,
+                    "accounts_pending": len(job.pending)
+                }
+                for job in sorted(self.jobs.values(), key=lambda job: (job.priority, job.id))
+            ],
+            "queue_depth": {
+                phone_number: worker.queue_depth()
+                for phone_number, worker in self.workers.items()
+            },
+            "recent_wait_avg": sum(self.wait_times) / len(self.wait_times) if self.wait_times else 0,
+            "recent_wait_max": max(self.wait_times, default=0)
+        }
@@ -0,0 +1,232 @@
+import sys
+import math
+import time
+import random
+import asyncio
+import argparse
+import itertools
+from collections import defaultdict
+from types import SimpleNamespace
+from pyrogram.handlers import MessageHandler
+from config import OWNER_ID, DIALOG_PAGE_SIZE
+from rate_limiter import RateLimiter
+from records import GroupInfo
+import main as bot
+
+# Commands sent while the background broadcasts run, with their relative weights
+COMMAND_MIX = {"/status": 4, "/jobs": 4, "/start": 2, "/left": 1, "/scan": 1}
+BROADCAST_COMMAND = "/broadcast Load test message"
+
+class FakeBot:
+    """Stand-in for the bot client, answering every Bot API call after a fixed latency"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.me = SimpleNamespace(id=0, username="loadtest_bot")
+        self.calls = 0
+        self.message_ids = itertools.count(1)
+
+    async def call(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+class SyntheticMessage:
+    """Just enough of a pyrogram Message for the command handlers"""
+
+    def __init__(self, client, text, user_id, chat_id):
+        self._client = client
+        self.id = next(client.message_ids)
+        self.text = text
+        self.caption = None
+        self.command = None  # set by the command filter
+        self.document = None
+        self.reply_to_message = None
+        self.from_user = SimpleNamespace(id=user_id)
+        self.chat = SimpleNamespace(id=chat_id)
+
+    async def reply(self, text, **kwargs):
+        await self._client.call()
+        return SyntheticMessage(self._client, text, self._client.me.id, self.chat.id)
+
+    async def edit(self, text, **kwargs):
+        await self._client.call()
+        self.text = text
+        return self
+
+    edit_text = edit
+
+    async def reply_document(self, document, **kwargs):
+        await self._client.call()
+        return SyntheticMessage(self._client, None, self._client.me.id, self.chat.id)
+
+class LoadTestAccount:
+    """Stand-in for a user account client, every call takes a fixed latency"""
+
+    def __init__(self, index, group_count, latency):
+        self.group_ids = [-1000000000000 - index * 100000 - i for i in range(group_count)]
+        self.latency = latency
+        self.sent = 0
+
+    async def iter_groups(self):
+        for position, chat_id in enumerate(self.group_ids):
+            # One dialogs request per page
+            if position % DIALOG_PAGE_SIZE == 0:
+                await asyncio.sleep(self.latency)
+            yield GroupInfo(id=chat_id, title=f"Group {chat_id}", type="supergroup")
+
+    async def get_chat_members_count(self, chat_id):
+        await asyncio.sleep(self.latency)
+        return 100
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+
+    async def leave_chat(self, chat_id):
+        await asyncio.sleep(self.latency)
+
+    async def stop(self):
+        pass
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes a task sleeping for a fixed interval"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def describe(values):
+    """Format p50/p95/p99/max of a list of seconds in milliseconds"""
+    values = sorted(values)
+    return "  ".join(
+        f"{name} {percentile(values, fraction) * 1000:8.1f}"
+        for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+    )
+
+async def dispatch(client, message):
+    """Run a message through the registered handlers the way pyrogram's dispatcher does"""
+    for group in bot.app.dispatcher.groups.values():
+        for handler in group:
+            if isinstance(handler, MessageHandler) and await handler.check(client, message):
+                await handler.callback(client, message)
+                return True
+    return False
+
+async def run_load_test(args):
+    """Drive synthetic commands through the bot handlers and print latency and loop lag"""
+    random.seed(args.seed)
+    bot.init_managers()
+    session_manager = bot.session_manager
+
+    # Keep the real sessions.json untouched
+    async def save_session_data():
+        pass
+    session_manager.save_session_data = save_session_data
+
+    accounts = {
+        f"+1555{index:07d}": LoadTestAccount(index, args.groups, args.api_latency)
+        for index in range(args.accounts)
+    }
+    await session_manager.add_sessions(accounts)
+    if not args.rate_limit:
+        bot.rate_limiter = RateLimiter(capacity=10 ** 9)
+
+    # Let the handler registrations queued when main was imported run
+    await asyncio.sleep(0)
+
+    fake_bot = FakeBot(args.api_latency)
+    queue = asyncio.Queue()
+    timings = defaultdict(lambda: ([], []))  # command -> (queue waits, handler times)
+    errors = []
+    unhandled = 0
+
+    async def worker():
+        nonlocal unhandled
+        while True:
+            message, queued_at = await queue.get()
+            started = time.perf_counter()
+            try:
+                if not await dispatch(fake_bot, message):
+                    unhandled += 1
+            except Exception as e:
+                errors.append(f"{message.text.split()[0]}: {e!r}")
+            finally:
+                waits, runs = timings[message.text.split()[0]]
+                waits.append(started - queued_at)
+                runs.append(time.perf_counter() - started)
+                queue.task_done()
+
+    def submit(text, user_id=OWNER_ID):
+        queue.put_nowait((SyntheticMessage(fake_bot, text, user_id, user_id), time.perf_counter()))
+
+    lag_monitor = LoopLagMonitor()
+    tasks = [asyncio.create_task(lag_monitor.run())]
+    tasks += [asyncio.create_task(worker()) for _ in range(args.workers)]
+
+    started = time.perf_counter()
+    for _ in range(args.broadcasts):
+        submit(BROADCAST_COMMAND)
+    for _ in range(args.commands):
+        await asyncio.sleep(random.expovariate(args.rate))
+        # Some traffic comes from strangers and stops at is_owner
+        user_id = OWNER_ID + 1 if random.random() < args.foreign else OWNER_ID
+        submit(random.choices(list(COMMAND_MIX), weights=list(COMMAND_MIX.values()))[0], user_id)
+    await queue.join()
+    elapsed = time.perf_counter() - started
+
+    for task in tasks:
+        task.cancel()
+
+    sent = sum(account.sent for account in accounts.values())
+    print(
+        f"{args.commands} commands at {args.rate:g}/s and {args.broadcasts} broadcasts over "
+        f"{args.accounts} accounts x {args.groups} groups, {args.workers} workers, "
+        f"{args.api_latency * 1000:g} ms per API call"
+    )
+    print(f"Finished in {elapsed:.2f}s, {sent} group messages sent, {fake_bot.calls} Bot API calls")
+    print()
+    print("Latency in ms (queue wait + handler)")
+    for command, (waits, runs) in sorted(timings.items()):
+        totals = [wait + run for wait, run in zip(waits, runs)]
+        print(f"{command:<11} n={len(totals):<5} {describe(totals)}")
+        print(f"{'':<11} {'wait':<7} {describe(waits)}")
+    print()
+    print(f"Event loop lag in ms over {len(lag_monitor.samples)} samples")
+    print(f"{'':<19} {describe(lag_monitor.samples)}")
+    if unhandled:
+        print(f"{unhandled} messages matched no handler")
+    if errors:
+        print(f"{len(errors)} handler errors, first: {errors[0]}")
+    return 1 if errors or unhandled else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the bot command handlers with fake clients")
+    parser.add_argument("--accounts", type=int, default=10, help="Fake user accounts")
+    parser.add_argument("--groups", type=int, default=100, help="Groups per account")
+    parser.add_argument("--commands", type=int, default=200, help="Commands sent during the run")
+    parser.add_argument("--rate", type=float, default=20, help="Average commands per second")
+    parser.add_argument("--broadcasts", type=int, default=2, help="Broadcasts started at the beginning")
+    parser.add_argument("--api-latency", type=float, default=0.005, help="Seconds per Bot API or account call")
+    parser.add_argument("--workers", type=int, default=bot.app.workers, help="Concurrent handlers, like pyrogram's workers")
+    parser.add_argument("--foreign", type=float, default=0.1, help="Share of commands from non-owners")
+    parser.add_argument("--rate-limit", action="store_true", help="Keep the command rate limit instead of lifting it")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the command mix")
+    args = parser.parse_args(argv)
+    # Run on the loop the handlers were registered on at import
+    return bot.app.loop.run_until_complete(run_load_test(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,33 @@
-import asyncio
 import time
+
+# Taken before anything else is imported, for --profile-startup
+IMPORT_STARTED = time.perf_counter()
+
+import sys
+import asyncio
 import os
-from pyrogram import Client, filters, enums
-from pyrogram.types import Message
-from config import API_ID, API_HASH, BOT_TOKEN, OWNER_ID
-from session_manager import SessionManager
-from otp_handler import OTPHandler
-from broadcast import BroadcastManager
-from group_utils import GroupManager
+from collections import Counter
+from pyrogram import Client, filters, enums, idle
+from pyrogram.types import Message, CallbackQuery
+from config import API_ID, API_HASH, BOT_TOKEN, OWNER_ID, IMPORT_MAX_FILE_SIZE, RECORD_DIR
+from rate_limiter import RateLimiter
+from report import ReportBuilder, ReportManager
+from startup_profiler import StartupProfiler
 
-# Initialize managers
-session_manager = SessionManager()
-otp_handler = OTPHandler(session_manager)
-broadcast_manager = BroadcastManager(session_manager)
-group_manager = GroupManager(session_manager)
+# Managers are created by init_managers() once the event loop is running
+session_manager = None
+otp_handler = None
+broadcast_manager = None
+group_manager = None
+report_manager = None
+connection_watchdog = None
+session_importer = None
 
 # Bot start time
 bot_start_time = time.time()
 
 # Rate limiting storage
-user_last_command = {}
-user_command_count = {}
+rate_limiter = RateLimiter()
 
 # Initialize the bot client
 app = Client(
@@ -30,6 +37,32 @@ app = Client(
     bot_token=BOT_TOKEN
 )
 
+IMPORT_FINISHED = time.perf_counter()
+
+def init_managers():
+    """Import and construct the managers"""
+    global session_manager, otp_handler, broadcast_manager, group_manager
+    global report_manager, connection_watchdog, session_importer
+    from session_manager import SessionManager
+    from otp_handler import OTPHandler
+    from broadcast import BroadcastManager
+    from group_utils import GroupManager
+    from connection_watchdog import ConnectionWatchdog
+    from session_import import SessionImporter
+    
+    session_manager = SessionManager()
+    otp_handler = OTPHandler(session_manager)
+    broadcast_manager = BroadcastManager(session_manager)
+    group_manager = GroupManager(session_manager)
+    report_manager = ReportManager()
+    connection_watchdog = ConnectionWatchdog(session_manager)
+    session_importer = SessionImporter(session_manager, group_manager)
+    
+    # Record broadcast traffic for offline replay
+    if RECORD_DIR:
+        from recorder import Recorder
+        broadcast_manager.recorder = group_manager.recorder = Recorder(RECORD_DIR)
+
 def is_owner(func):
     """Decorator to check if user is owner"""
     async def wrapper(client, message: Message):
@@ -43,30 +76,32 @@ def rate_limit(func):
     """Decorator for rate limiting"""
     async def wrapper(client, message: Message):
         user_id = message.from_user.id
-        current_time = time.time()
+        command = message.command[0] if message.command else None
         
-        # Check if user has previous command time
-        if user_id in user_last_command:
-            # Reset count if window has passed
-            if current_time - user_last_command[user_id] > 60:  # 60 seconds window
-                user_command_count[user_id] = 0
-                
-        # Initialize if not exists
-        if user_id not in user_command_count:
-            user_command_count[user_id] = 0
-            
         # Check rate limit
-        if user_command_count[user_id] >= 10:  # Max 10 commands per minute
-            await message.reply("Rate limit exceeded. Please wait before sending more commands.")
+        if not rate_limiter.consume(user_id, command):
+            retry_after = int(rate_limiter.retry_after(user_id, command)) + 1
+            await message.reply(f"Rate limit exceeded. Please wait {retry_after}s before sending more commands.")
             return
-            
-        # Update command count
-        user_command_count[user_id] += 1
-        user_last_command[user_id] = current_time
         
         return await func(client, message)
     return wrapper
 
+def add_account_result(report, phone_number, result, success_label):
+    """Add the lines for one account's result to a report"""
+    if result.error:
+        report.add(f"📱 {phone_number}: Error - {result.error}")
+    else:
+        report.add(f"📱 {phone_number}:")
+        report.add(f"   ✅ {success_label}: {result.success}")
+        report.add(f"   ❌ Failed: {result.failed}")
+        if result.failed:
+            # Titles are only looked up now, results keep chat ids
+            group_index = session_manager.get_group_index(phone_number)
+            report.add(f"   Errors: {result.describe_histogram()}")
+            report.add(f"   First failures: {', '.join(result.describe_failures(group_index))}")
+    report.add()
+
 @app.on_message(filters.command("start"))
 @is_owner
 @rate_limit
@@ -77,10 +112,12 @@ async def start_command(client, message: Message):
 
 **Available Commands:**
 /addid <phone_number> - Add new account
-/otp <code> - Verify OTP
-/password <2fa_password> - 2FA authentication
+/import - Add accounts from an uploaded file of session strings
+/otp <phone_number> <code> - Verify OTP
+/password <phone_number> <2fa_password> - 2FA authentication
 /scan - Scan all groups for added accounts
-/broadcast <message> - Broadcast message to groups
+/broadcast [--urgent] <message> - Broadcast message to groups
+/jobs - Show running broadcasts and queue depth
 /left - Leave muted/read-only groups
 /status - Show session status
 /removeid <phone_number> - Remove account
@@ -116,17 +153,18 @@ async def addid_command(client, message: Message):
 async def otp_command(client, message: Message):
     """Handle /otp command"""
     if len(message.command) < 2:
-        await message.reply("Please provide the OTP code. Usage: /otp <code>")
+        await message.reply("Please provide the OTP code. Usage: /otp <phone_number> <code>")
         return
         
-    # Get the latest pending login
-    pending_logins = list(otp_handler.pending_logins.keys())
-    if not pending_logins:
+    if not otp_handler.pending_logins:
         await message.reply("No pending login found. Please use /addid first.")
         return
         
-    phone_number = pending_logins[0]  # Get the first pending login
-    otp_code = message.command[1]
+    # The phone number may be omitted while a single login is pending
+    phone_number, otp_code = otp_handler.resolve_phone(" ".join(message.command[1:]))
+    if not phone_number:
+        await message.reply("No pending login matches, give the phone number used with /addid. Usage: /otp <phone_number> <code>")
+        return
     
     # Verify OTP
     success, response = await otp_handler.verify_otp(phone_number, otp_code)
@@ -138,33 +176,87 @@ async def otp_command(client, message: Message):
 async def password_command(client, message: Message):
     """Handle /password command for 2FA"""
     if len(message.command) < 2:
-        await message.reply("Please provide the 2FA password. Usage: /password <password>")
+        await message.reply("Please provide the 2FA password. Usage: /password <phone_number> <password>")
         return
         
-    # Get the latest pending login
-    pending_logins = list(otp_handler.pending_logins.keys())
-    if not pending_logins:
+    if not otp_handler.pending_logins:
         await message.reply("No pending login found. Please use /addid first.")
         return
         
-    phone_number = pending_logins[0]  # Get the first pending login
-    password = message.text[len("/password "):]  # Get everything after the command
+    # Get everything after the command, the phone number may be omitted
+    # while a single login is pending
+    args = message.text.split(maxsplit=1)[1]
+    phone_number, password = otp_handler.resolve_phone(args)
+    if not phone_number:
+        await message.reply("No pending login matches, give the phone number used with /addid. Usage: /password <phone_number> <password>")
+        return
     
     # Handle 2FA
     success, response = await otp_handler.handle_2fa(phone_number, password)
     await message.reply(response)
 
+@app.on_message(filters.command("import"))
+@is_owner
+@rate_limit
+async def import_command(client, message: Message):
+    """Handle /import command"""
+    # Accept the file as the command's attachment or as the replied-to message
+    document_msg = message if message.document else message.reply_to_message
+    if not document_msg or not document_msg.document:
+        await message.reply("Please send a file of session strings, one per line, with the caption /import or reply to it with /import.")
+        return
+        
+    if document_msg.document.file_size > IMPORT_MAX_FILE_SIZE:
+        await message.reply("The file is too large.")
+        return
+        
+    # Send processing message
+    from session_import import parse_session_strings
+    processing_msg = await message.reply("Importing sessions...")
+    
+    content = await document_msg.download(in_memory=True)
+    session_strings = parse_session_strings(bytes(content.getbuffer()).decode("utf-8", errors="ignore"))
+    if not session_strings:
+        await processing_msg.edit("No session strings found in the file.")
+        return
+        
+    imported, failures = await session_importer.import_sessions(session_strings)
+    
+    # Format results
+    report = ReportBuilder("**Import Results:**", file_name="import_report.txt")
+    report.add(f"✅ Imported: {len(imported)}")
+    report.add(f"❌ Failed: {len(failures)}")
+    for phone_number in imported:
+        report.add(f"📱 {phone_number}")
+    if failures:
+        report.add()
+        report.add("**Failures:**")
+        for entry_number, phone_number, reason in failures:
+            report.add(f"#{entry_number}{f' ({phone_number})' if phone_number else ''}: {reason}")
+    if imported:
+        report.add()
+        report.add("Group indexes are being built in the background.")
+        
+    await report_manager.send(processing_msg, report)
+
 @app.on_message(filters.command("broadcast"))
 @is_owner
 @rate_limit
 async def broadcast_command(client, message: Message):
     """Handle /broadcast command"""
     if len(message.command) < 2:
-        await message.reply("Please provide a message to broadcast. Usage: /broadcast <message>")
+        await message.reply("Please provide a message to broadcast. Usage: /broadcast [--urgent] <message>")
         return
         
     broadcast_text = message.text[len("/broadcast "):]
     
+    # Urgent broadcasts pre-empt running ones
+    from job_scheduler import PRIORITY_NORMAL, PRIORITY_URGENT
+    priority = PRIORITY_NORMAL
+    if broadcast_text.startswith("--urgent"):
+        priority = PRIORITY_URGENT
+        broadcast_text = broadcast_text[len("--urgent"):].strip()
+    
     if not broadcast_text:
         await message.reply("Please provide a message to broadcast.")
         return
@@ -178,34 +270,57 @@ async def broadcast_command(client, message: Message):
     processing_msg = await message.reply("Broadcasting message to all groups...")
     
     # Broadcast message
-    results = await broadcast_manager.broadcast_to_groups(broadcast_text)
+    results = await broadcast_manager.broadcast_to_groups(broadcast_text, priority=priority)
     
     # Format results
-    result_text = "**Broadcast Results:**\n\n"
+    report = ReportBuilder("**Broadcast Results:**", file_name="broadcast_report.txt")
     total_success = 0
     total_failed = 0
     
     for phone_number, result in results.items():
-        if "error" in result:
-            result_text += f"📱 {phone_number}: Error - {result['error']}\n"
-        else:
-            result_text += f"📱 {phone_number}:\n"
-            result_text += f"   ✅ Success: {result['success']}\n"
-            result_text += f"   ❌ Failed: {result['failed']}\n"
-            total_success += result['success']
-            total_failed += result['failed']
-            
-            if result['errors']:
-                result_text += f"   Errors: {', '.join(result['errors'][:3])}"  # Show first 3 errors
-                if len(result['errors']) > 3:
-                    result_text += f" (and {len(result['errors']) - 3} more...)"
-                result_text += "\n"
-        result_text += "\n"
+        add_account_result(report, phone_number, result, "Success")
+        total_success += result.success
+        total_failed += result.failed
         
-    result_text += f"📊 **Total:**\n✅ Success: {total_success}\n❌ Failed: {total_failed}"
+    report.add("📊 **Total:**")
+    report.add(f"✅ Success: {total_success}")
+    report.add(f"❌ Failed: {total_failed}")
     
     # Edit the processing message with results
-    await processing_msg.edit(result_text, parse_mode=enums.ParseMode.MARKDOWN)
+    await report_manager.send(processing_msg, report)
+
+@app.on_message(filters.command("jobs"))
+@is_owner
+@rate_limit
+async def jobs_command(client, message: Message):
+    """Handle /jobs command"""
+    stats = broadcast_manager.scheduler.get_stats()
+    
+    report = ReportBuilder("**Broadcast Jobs:**", file_name="jobs_report.txt")
+    if not stats["jobs"]:
+        report.add("No broadcasts running.")
+    for job in stats["jobs"]:
+        state = "sending" if job["started"] else "waiting"
+        report.add(f"#{job['id']} ({job['priority']}) - {state}")
+        report.add(f"   ⏳ Waited: {job['wait_time']:.1f}s")
+        report.add(f"   📤 Sent: {job['sent']}")
+        report.add(f"   📱 Accounts left: {job['accounts_pending']}")
+        
+    report.add()
+    report.add(f"⏱ Recent wait: avg {stats['recent_wait_avg']:.1f}s, max {stats['recent_wait_max']:.1f}s")
+    
+    if stats["queue_depth"]:
+        # Summary first, the per-account lines can run over many pages
+        depths = Counter(stats["queue_depth"].values())
+        report.add()
+        report.add("**Queue Depth:**")
+        for depth, accounts in sorted(depths.items(), reverse=True):
+            report.add(f"{depth} job(s): {accounts} account(s)")
+        report.add()
+        for phone_number, depth in stats["queue_depth"].items():
+            report.add(f"📱 {phone_number}: {depth} job(s)")
+            
+    await report_manager.reply(message, report)
 
 @app.on_message(filters.command("left"))
 @is_owner
@@ -224,21 +339,13 @@ async def left_command(client, message: Message):
     results = await group_manager.leave_muted_groups()
     
     # Format results
-    result_text = "**Left Groups Results:**\n\n"
+    report = ReportBuilder("**Left Groups Results:**", file_name="left_report.txt")
     
     for phone_number, result in results.items():
-        if "error" in result:
-            result_text += f"📱 {phone_number}: Error - {result['error']}\n"
-        else:
-            result_text += f"📱 {phone_number}:\n"
-            result_text += f"   ✅ Left: {result['left']}\n"
-            result_text += f"   ❌ Failed: {result['failed']}\n"
-            if result['errors']:
-                result_text += f"   Errors: {', '.join(result['errors'][:3])}\n"
-        result_text += "\n"
+        add_account_result(report, phone_number, result, "Left")
         
     # Edit the processing message with results
-    await processing_msg.edit(result_text, parse_mode=enums.ParseMode.MARKDOWN)
+    await report_manager.send(processing_msg, report)
 
 @app.on_message(filters.command("status"))
 @is_owner
@@ -251,28 +358,14 @@ async def status_command(client, message: Message):
     uptime_minutes = (uptime_seconds % 3600) // 60
     uptime_seconds = uptime_seconds % 60
     
-    # Get session status
-    session_status = session_manager.get_session_status()
-    
-    # Format status message
-    status_text = f"**Bot Status**\n"
-    status_text += f"⏱ Uptime: {uptime_hours}h {uptime_minutes}m {uptime_seconds}s\n\n"
-    
-    if not session_status:
-        status_text += "No active sessions.\n"
-    else:
-        status_text += "**Active Sessions:**\n"
-        for phone_number, data in session_status.items():
-            status_text += f"📱 {phone_number}\n"
-            status_text += f"   📚 Groups: {data['groups']}\n"
-            if data['last_broadcast']:
-                status_text += f"   📢 Last Broadcast: {data['last_broadcast']}\n"
-            else:
-                status_text += f"   📢 Last Broadcast: Never\n"
-            status_text += f"   ⏰ Expired: {'Yes' if data['expired'] else 'No'}\n"
-            status_text += "\n"
-            
-    await message.reply(status_text, parse_mode=enums.ParseMode.MARKDOWN)
+    # Format status report, paged since large fleets don't fit one message
+    report = ReportBuilder("**Bot Status**", file_name="status_report.txt")
+    report.add(f"⏱ Uptime: {uptime_hours}h {uptime_minutes}m {uptime_seconds}s")
+    report.add()
+    for line in session_manager.render_status():
+        report.add(line)
+        
+    await report_manager.reply(message, report)
 
 @app.on_message(filters.command("removeid"))
 @is_owner
@@ -309,7 +402,7 @@ async def scan_command(client, message: Message):
     
     # Scan groups for each session
     results = {}
-    for phone_number, client in session_manager.get_all_sessions().items():
+    for phone_number, client in broadcast_manager.get_clients().items():
         try:
             # Get group list
             groups = await broadcast_manager.get_group_list(client)
@@ -317,8 +410,10 @@ async def scan_command(client, message: Message):
             # Count groups
             group_count = len(groups)
             
-            # Update session group count
-            await session_manager.update_session_groups(phone_number, group_count)
+            # Update session usage, group count and index, saved once after the scan
+            session_manager.update_session_usage(phone_number)
+            session_manager.set_group_index(phone_number, groups)
+            await session_manager.update_session_groups(phone_number, group_count, save=False)
             
             results[phone_number] = {
                 "groups": group_count,
@@ -326,26 +421,33 @@ async def scan_command(client, message: Message):
             }
         except Exception as e:
             results[phone_number] = {"error": str(e)}
+    await session_manager.save_session_data()
     
     # Format results
-    result_text = "**Scan Results:**\n\n"
+    report = ReportBuilder("**Scan Results:**", file_name="scan_report.txt")
     
     for phone_number, result in results.items():
         if "error" in result:
-            result_text += f"📱 {phone_number}: Error - {result['error']}\n"
+            report.add(f"📱 {phone_number}: Error - {result['error']}")
         else:
-            result_text += f"📱 {phone_number}:\n"
-            result_text += f"   📚 Groups: {result['groups']}\n"
+            report.add(f"📱 {phone_number}:")
+            report.add(f"   📚 Groups: {result['groups']}")
             if result['groups'] > 0:
-                result_text += "   Group List:\n"
-                for group in result['group_list'][:10]:  # Show first 10 groups
-                    result_text += f"   - {group['title']} ({group['type']})\n"
-                if result['groups'] > 10:
-                    result_text += f"   ... and {result['groups'] - 10} more groups\n"
-            result_text += "\n"
+                report.add("   Group List:")
+                for group in result['group_list']:
+                    report.add(f"   - {group.title} ({group.type})")
+            report.add()
             
     # Edit the processing message with results
-    await processing_msg.edit(result_text, parse_mode=enums.ParseMode.MARKDOWN)
+    await report_manager.send(processing_msg, report)
+
+@app.on_callback_query(filters.regex(r"^report:"))
+async def report_callback(client, callback_query: CallbackQuery):
+    """Handle report pagination buttons"""
+    if callback_query.from_user.id != OWNER_ID:
+        await callback_query.answer("You are not authorized to use this bot.", show_alert=True)
+        return
+    await report_manager.handle_callback(callback_query)
 
 @app.on_message(filters.command("clearall"))
 @is_owner
@@ -373,21 +475,60 @@ async def clearall_command(client, message: Message):
     except asyncio.TimeoutError:
         await message.reply("No confirmation received. Operation cancelled.")
 
-async def main():
+async def main(profile_startup=False):
     """Main function to start the bot"""
+    profiler = StartupProfiler(IMPORT_STARTED)
+    profiler.record("import", IMPORT_STARTED, IMPORT_FINISHED)
+    
+    # Create managers
+    started = time.perf_counter()
+    init_managers()
+    profiler.record("managers", started)
+    
     # Load session data
+    started = time.perf_counter()
     await session_manager.load_session_data()
+    profiler.record("session-load", started)
+    
+    # Start saved account clients while the bot connects
+    started = time.perf_counter()
+    client_start = asyncio.create_task(session_manager.start_saved_sessions())
     
     # Start the bot
     await app.start()
+    profiler.record("bot-start", started)
+    profiler.mark_ready()
     print("Telegram Broadcasting Bot started!")
     
-    # Run forever
-    await asyncio.idle()
+    # Remove sessions in the background as they expire
+    expiry_sweeper = asyncio.create_task(session_manager.run_expiry_sweeper())
+    login_purger = asyncio.create_task(otp_handler.run_login_purger())
+    
+    # Keep only live clients in rotation, this also retries clients that failed to start
+    watchdog = asyncio.create_task(connection_watchdog.run())
+    
+    await client_start
+    profiler.record("client-start", started)
     
+    if profile_startup:
+        print(profiler.report())
+    else:
+        # Run forever
+        await idle()
+        
     # Stop the bot
+    expiry_sweeper.cancel()
+    login_purger.cancel()
+    watchdog.cancel()
+    await session_manager.stop_all_clients()
     await app.stop()
 
+def cli():
+    """Command line entry point"""
+    # app.run() uses the loop the handlers were registered on at import,
+    # asyncio.run() would start a new one and the handlers would never be added
+    app.run(main(profile_startup="--profile-startup" in sys.argv[1:]))
+
 if __name__ == "__main__":
     # Run the main function
-    asyncio.run(main())
+    cli()
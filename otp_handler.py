@@ -1,14 +1,141 @@
+import re
+import time
 import asyncio
+from collections import OrderedDict
 from pyrogram import Client
-from config import API_ID, API_HASH, SESSION_DIR
+from pyrogram.errors import (
+    SessionPasswordNeeded, PhoneCodeInvalid, PhoneCodeEmpty, PasswordHashInvalid, FloodWait
+)
+from dialogs import iter_groups
+from config import API_ID, API_HASH, SESSION_DIR, PENDING_LOGIN_TTL
+
+# A phone number as typed in /otp and /password, long enough not to be a login code
+PHONE_NUMBER_RE = re.compile(r"\+?\d{7,15}")
+
+# Sign-in errors after which the same login can be tried again
+RETRYABLE_LOGIN_ERRORS = (SessionPasswordNeeded, PhoneCodeInvalid, PhoneCodeEmpty, PasswordHashInvalid, FloodWait)
+
+class PendingLogins:
+    """Pending logins keyed by phone number that expire PENDING_LOGIN_TTL seconds after /addid"""
+
+    def __init__(self, ttl=PENDING_LOGIN_TTL):
+        self.ttl = ttl
+        self.logins = OrderedDict()  # phone_number -> (login_data, expires_at), oldest first
+
+    def __contains__(self, phone_number):
+        return phone_number in self.logins
+
+    def __len__(self):
+        return len(self.logins)
+
+    def __getitem__(self, phone_number):
+        return self.logins[phone_number][0]
+
+    def __setitem__(self, phone_number, login_data):
+        self.logins.pop(phone_number, None)
+        self.logins[phone_number] = (login_data, time.monotonic() + self.ttl)
+
+    def __delitem__(self, phone_number):
+        del self.logins[phone_number]
+
+    def keys(self):
+        return self.logins.keys()
+
+    def pop(self, phone_number, default=None):
+        entry = self.logins.pop(phone_number, None)
+        return default if entry is None else entry[0]
+
+    def take(self, phone_number):
+        """Remove a login while it is being used, returning an entry for restore() or None"""
+        return self.logins.pop(phone_number, None)
+
+    def restore(self, phone_number, entry):
+        """Put back an entry from take() with its original deadline, keeping expiry order"""
+        self.logins[phone_number] = entry
+        for key in [key for key, (_, expires_at) in self.logins.items() if expires_at > entry[1]]:
+            self.logins.move_to_end(key)
+
+    def next_expiry(self):
+        """Get the monotonic time the oldest login expires, or None"""
+        if not self.logins:
+            return None
+        return next(iter(self.logins.values()))[1]
+
+    def pop_expired(self):
+        """Remove and return the data of expired logins"""
+        now = time.monotonic()
+        expired = []
+        while self.logins:
+            phone_number, (login_data, expires_at) = next(iter(self.logins.items()))
+            if expires_at > now:
+                break
+            del self.logins[phone_number]
+            expired.append(login_data)
+        return expired
 
 class OTPHandler:
     def __init__(self, session_manager):
         self.session_manager = session_manager
-        self.pending_logins = {}  # Store pending logins with phone numbers
+        self.pending_logins = PendingLogins()  # Store pending logins with phone numbers
+        self.background_tasks = set()
+
+    async def _disconnect(self, client):
+        """Disconnect a temporary login client, ignoring errors"""
+        try:
+            await client.disconnect()
+        except Exception:
+            pass
+
+    async def purge_expired_logins(self):
+        """Disconnect the temporary clients of abandoned logins"""
+        expired = self.pending_logins.pop_expired()
+        await asyncio.gather(*(self._disconnect(login_data["client"]) for login_data in expired))
+        return len(expired)
+
+    async def run_login_purger(self):
+        """Purge abandoned logins as they expire"""
+        while True:
+            next_expiry = self.pending_logins.next_expiry()
+            delay = self.pending_logins.ttl if next_expiry is None else next_expiry - time.monotonic()
+            await asyncio.sleep(max(0, delay))
+            await self.purge_expired_logins()
+
+    def resolve_phone(self, args):
+        """Split command arguments into a pending phone number and the rest.
+
+        The phone number may be omitted while exactly one login is pending.
+        Returns (None, None) when no pending login matches, including a
+        phone number that isn't pending, so a mistyped or expired number
+        never spends a sign-in attempt of another account.
+        """
+        parts = args.split(maxsplit=1)
+        if len(parts) == 2:
+            if parts[0] in self.pending_logins:
+                return parts[0], parts[1]
+            if PHONE_NUMBER_RE.fullmatch(parts[0]):
+                return None, None
+        if len(self.pending_logins) == 1:
+            return next(iter(self.pending_logins.keys())), args
+        return None, None
+
+    def _schedule_group_scan(self, phone_number, client):
+        """Count the groups of a new account without blocking the login reply"""
+        async def scan():
+            groups = await self.get_group_count(client)
+            await self.session_manager.update_session_groups(phone_number, groups)
+        task = asyncio.create_task(scan())
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
         
     async def send_otp(self, phone_number):
         """Send OTP to the provided phone number"""
+        await self.purge_expired_logins()
+        
+        # Drop an earlier attempt for the same number
+        previous = self.pending_logins.pop(phone_number)
+        if previous:
+            await self._disconnect(previous["client"])
+            
         try:
             # Create a temporary client for login
             temp_client = Client(
@@ -19,7 +146,12 @@ class OTPHandler:
             )
             
             # Send code request
-            sent_code = await temp_client.send_code(phone_number)
+            await temp_client.connect()
+            try:
+                sent_code = await temp_client.send_code(phone_number)
+            except Exception:
+                await self._disconnect(temp_client)
+                raise
             
             # Store the client for later use in OTP verification
             self.pending_logins[phone_number] = {
@@ -27,67 +159,83 @@ class OTPHandler:
                 "phone_code_hash": sent_code.phone_code_hash
             }
             
-            return True, "OTP sent successfully. Please use /otp <code> to complete login."
+            return True, f"OTP sent successfully. Please use /otp {phone_number} <code> to complete login."
         except Exception as e:
             return False, f"Failed to send OTP: {str(e)}"
             
+    async def _finish_login(self, phone_number, entry, sign_in):
+        """Run a sign-in step on a login taken out of the pending logins.
+
+        The login is taken first so the purger can't expire it mid sign-in,
+        and is put back only when the user can try again.
+        """
+        temp_client = entry[0]["client"]
+        try:
+            signed_in_user = await sign_in(temp_client)
+        except RETRYABLE_LOGIN_ERRORS:
+            self.pending_logins.restore(phone_number, entry)
+            raise
+        except Exception:
+            await self._disconnect(temp_client)
+            raise
+            
+        # Login successful, add to session manager
+        await self.session_manager.add_session(phone_number, temp_client)
+        
+        # Get group count in the background
+        self._schedule_group_scan(phone_number, temp_client)
+        return signed_in_user
+        
     async def verify_otp(self, phone_number, otp_code):
         """Verify OTP and complete login"""
+        await self.purge_expired_logins()
         try:
-            if phone_number not in self.pending_logins:
+            entry = self.pending_logins.take(phone_number)
+            if entry is None:
                 return False, "No pending login for this phone number. Please use /addid first."
                 
-            login_data = self.pending_logins[phone_number]
-            temp_client = login_data["client"]
-            phone_code_hash = login_data["phone_code_hash"]
+            phone_code_hash = entry[0]["phone_code_hash"]
             
             # Try to sign in with the provided OTP
             try:
-                signed_in_user = await temp_client.sign_in(
-                    phone_number=phone_number,
-                    phone_code_hash=phone_code_hash,
-                    phone_code=otp_code
+                signed_in_user = await self._finish_login(
+                    phone_number, entry,
+                    lambda client: client.sign_in(
+                        phone_number=phone_number,
+                        phone_code_hash=phone_code_hash,
+                        phone_code=otp_code
+                    )
                 )
-                
-                # Login successful, add to session manager
-                await self.session_manager.add_session(phone_number, temp_client)
-                del self.pending_logins[phone_number]
-                
-                # Get group count
-                groups = await self.get_group_count(temp_client)
-                await self.session_manager.update_session_groups(phone_number, groups)
-                
                 return True, f"Login successful for {signed_in_user.first_name}!"
-            except Exception as e:
+            except SessionPasswordNeeded:
+                return False, f"Two-step verification is enabled. Please use /password {phone_number} <password>."
+            except RETRYABLE_LOGIN_ERRORS as e:
                 return False, f"Failed to verify OTP: {str(e)}"
+            except Exception as e:
+                return False, f"Failed to verify OTP: {str(e)}. Please use /addid again."
                 
         except Exception as e:
             return False, f"Error during OTP verification: {str(e)}"
             
     async def handle_2fa(self, phone_number, password):
         """Handle 2FA authentication"""
+        await self.purge_expired_logins()
         try:
-            if phone_number not in self.pending_logins:
+            entry = self.pending_logins.take(phone_number)
+            if entry is None:
                 return False, "No pending login for this phone number."
                 
-            login_data = self.pending_logins[phone_number]
-            temp_client = login_data["client"]
-            
             # Try to sign in with password
             try:
-                signed_in_user = await temp_client.check_password(password)
-                
-                # Login successful, add to session manager
-                await self.session_manager.add_session(phone_number, temp_client)
-                del self.pending_logins[phone_number]
-                
-                # Get group count
-                groups = await self.get_group_count(temp_client)
-                await self.session_manager.update_session_groups(phone_number, groups)
-                
+                signed_in_user = await self._finish_login(
+                    phone_number, entry,
+                    lambda client: client.check_password(password)
+                )
                 return True, f"2FA successful! Logged in as {signed_in_user.first_name}."
-            except Exception as e:
+            except RETRYABLE_LOGIN_ERRORS as e:
                 return False, f"Failed to authenticate with password: {str(e)}"
+            except Exception as e:
+                return False, f"Failed to authenticate with password: {str(e)}. Please use /addid again."
                 
         except Exception as e:
             return False, f"Error during 2FA: {str(e)}"
@@ -96,20 +244,10 @@ class OTPHandler:
         """Get the number of groups the account is in with improved accuracy"""
         try:
             count = 0
-            async for dialog in client.get_dialogs():
-                # Check if it's a group or supergroup
-                if dialog.chat and dialog.chat.type in ["group", "supergroup"]:
-                    # Check if bot is admin in the group and can send messages
-                    try:
-                        bot_member = await client.get_chat_member(dialog.chat.id, "me")
-                        can_send_messages = getattr(bot_member, 'can_send_messages', True)
-                        
-                        # Only count groups where bot can send messages
-                        if can_send_messages:
-                            count += 1
-                    except:
-                        # If we can't get bot member status, count the group anyway
-                        count += 1
+            async for group in iter_groups(client):
+                # Only count groups where the account can send messages
+                if group.can_send_messages:
+                    count += 1
             return count
         except Exception as e:
             print(f"Error getting group count: {e}")
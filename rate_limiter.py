@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+from config import RATE_LIMIT_WINDOW, MAX_COMMANDS_PER_WINDOW, COMMAND_COSTS, DEFAULT_COMMAND_COST
+
+class RateLimiter:
+    """Token bucket rate limiter keyed by user id.
+
+    Each user holds a bucket of ``capacity`` tokens that refills continuously
+    over ``window`` seconds, so the limit slides with time instead of resetting
+    on the last command. A user whose bucket would be full again is dropped,
+    which keeps memory bounded by the number of recently active users.
+    """
+
+    def __init__(self, capacity=MAX_COMMANDS_PER_WINDOW, window=RATE_LIMIT_WINDOW,
+                 costs=None, default_cost=DEFAULT_COMMAND_COST, clock=time.monotonic):
+        self.capacity = float(capacity)
+        self.window = float(window)
+        self.refill_rate = self.capacity / self.window
+        self.costs = dict(COMMAND_COSTS if costs is None else costs)
+        self.default_cost = default_cost
+        self.clock = clock
+        # user_id -> (tokens, last_update), ordered by last_update
+        self.buckets = OrderedDict()
+
+    def cost_of(self, command):
+        """Get the token cost of a command"""
+        return self.costs.get(command, self.default_cost)
+
+    def _evict_idle(self, now):
+        """Drop buckets that have been idle long enough to be full again"""
+        while self.buckets:
+            user_id, (tokens, updated) = next(iter(self.buckets.items()))
+            if tokens + (now - updated) * self.refill_rate < self.capacity:
+                break
+            del self.buckets[user_id]
+
+    def _tokens(self, user_id, now):
+        """Get the current token count for a user"""
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            return self.capacity
+        tokens, updated = bucket
+        return min(self.capacity, tokens + (now - updated) * self.refill_rate)
+
+    def consume(self, user_id, command=None):
+        """Try to spend tokens for a command, returns True if allowed"""
+        now = self.clock()
+        self._evict_idle(now)
+
+        cost = min(self.cost_of(command), self.capacity)
+        tokens = self._tokens(user_id, now)
+        if tokens < cost:
+            return False
+
+        self.buckets[user_id] = (tokens - cost, now)
+        self.buckets.move_to_end(user_id)
+        return True
+
+    def retry_after(self, user_id, command=None):
+        """Get the seconds until a command would be allowed"""
+        now = self.clock()
+        cost = min(self.cost_of(command), self.capacity)
+        missing = cost - self._tokens(user_id, now)
+        return max(0.0, missing / self.refill_rate)
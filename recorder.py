@@ -0,0 +1,245 @@
+import sys
+import builtins
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from collections import deque, defaultdict
+from pyrogram import errors
+from records import GroupInfo
+from dialogs import iter_groups
+
+class Recorder:
+    """Appends client events of one bot run to a JSON lines file"""
+
+    def __init__(self, record_dir):
+        Path(record_dir).mkdir(parents=True, exist_ok=True)
+        self.path = Path(record_dir) / f"{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+        self.file = open(self.path, "a", buffering=1, encoding="utf-8")
+        self.started = time.monotonic()
+        self.wrappers = {}  # phone_number -> RecordingClient
+        self.write({"op": "start", "time": time.time()})
+
+    def write(self, event):
+        event["t"] = round(time.monotonic() - self.started, 4)
+        self.file.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+    def wrap(self, phone_number, client):
+        """Get the recording wrapper of a client, reusing it so identity checks hold"""
+        wrapper = self.wrappers.get(phone_number)
+        if wrapper is None or wrapper.client is not client:
+            wrapper = RecordingClient(client, phone_number, self)
+            self.wrappers[phone_number] = wrapper
+        return wrapper
+
+    def wrap_sessions(self, sessions):
+        return {phone_number: self.wrap(phone_number, client) for phone_number, client in sessions.items()}
+
+    def close(self):
+        self.file.close()
+
+def _error_fields(error):
+    """Describe an exception compactly, keeping the wait value of flood errors"""
+    fields = {"err": type(error).__name__}
+    value = getattr(error, "value", None)
+    if isinstance(value, int):
+        fields["val"] = value
+    return fields
+
+class RecordingClient:
+    """Wraps a pyrogram client and records the calls the send engine makes"""
+
+    def __init__(self, client, phone_number, recorder):
+        self.client = client
+        self.phone_number = phone_number
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def _record(self, op, call, chat_id=None, describe=None):
+        event = {"op": op, "acct": self.phone_number}
+        if chat_id is not None:
+            event["chat"] = chat_id
+        start = time.monotonic()
+        try:
+            result = await call
+            if describe:
+                event.update(describe(result))
+            return result
+        except Exception as e:
+            event.update(_error_fields(e))
+            raise
+        finally:
+            event["lat"] = round(time.monotonic() - start, 4)
+            self.recorder.write(event)
+
+    async def iter_groups(self):
+        """Yield groups, recording them and the time spent waiting for them"""
+        event = {"op": "groups", "acct": self.phone_number, "chats": []}
+        latency = 0.0
+        start = time.monotonic()
+        try:
+            async for group in iter_groups(self.client):
+                latency += time.monotonic() - start
+                event["chats"].append([
+                    group.id, group.title, group.type, group.username,
+                    group.is_admin, group.can_send_messages, group.muted_until,
+                    group.member_count
+                ])
+                yield group
+                start = time.monotonic()
+        except Exception as e:
+            latency += time.monotonic() - start
+            event.update(_error_fields(e))
+            raise
+        finally:
+            event["lat"] = round(latency, 4)
+            self.recorder.write(event)
+
+    async def get_chat_members_count(self, chat_id):
+        return await self._record(
+            "members_count", self.client.get_chat_members_count(chat_id), chat_id,
+            lambda count: {"count": count}
+        )
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self._record("send", self.client.send_message(chat_id, text, **kwargs), chat_id)
+
+    async def leave_chat(self, chat_id, *args, **kwargs):
+        return await self._record("leave", self.client.leave_chat(chat_id, *args, **kwargs), chat_id)
+
+def load_recording(path):
+    """Group recorded events by account, then by (op, chat id) in call order"""
+    accounts = defaultdict(lambda: defaultdict(deque))
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            if "acct" in event:
+                accounts[event["acct"]][(event["op"], event.get("chat"))].append(event)
+    return accounts
+
+def _rebuild_error(event):
+    """Recreate a recorded exception"""
+    error_type = getattr(errors, event["err"], None)
+    if isinstance(error_type, type) and issubclass(error_type, errors.RPCError):
+        return error_type(value=event.get("val"))
+    builtin = getattr(builtins, event["err"], None)
+    if isinstance(builtin, type) and issubclass(builtin, Exception):
+        return builtin(f"Replayed {event['err']}")
+    return RuntimeError(f"Replayed {event['err']}")
+
+class ReplayClient:
+    """Fake client that answers with the responses recorded for one account.
+
+    Calls sleep for the recorded latency divided by speed. Calls without a
+    recorded response succeed at once, so edited engines still run.
+    """
+
+    def __init__(self, events, speed=1.0):
+        self.events = events
+        self.speed = speed
+        self.calls = 0
+
+    async def _replay(self, op, chat_id=None):
+        self.calls += 1
+        queue = self.events.get((op, chat_id))
+        if not queue:
+            return None
+        event = queue.popleft()
+        if event["lat"] and self.speed:
+            await asyncio.sleep(event["lat"] / self.speed)
+        if "err" in event:
+            raise _rebuild_error(event)
+        return event
+
+    async def iter_groups(self):
+        event = await self._replay("groups")
+        if event is None:
+            return
+        # Older recordings have no member count
+        for chat_id, title, chat_type, username, is_admin, can_send, muted_until, *rest in event["chats"]:
+            yield GroupInfo(
+                id=chat_id,
+                title=title,
+                type=chat_type,
+                username=username,
+                member_count=rest[0] if rest else None,
+                is_admin=is_admin,
+                can_send_messages=can_send,
+                muted_until=muted_until
+            )
+
+    async def get_chat_members_count(self, chat_id):
+        event = await self._replay("members_count", chat_id)
+        return None if event is None else event["count"]
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._replay("send", chat_id)
+
+    async def leave_chat(self, chat_id, *args, **kwargs):
+        await self._replay("leave", chat_id)
+
+    async def stop(self):
+        pass
+
+class ScaledClock:
+    """Wall clock that runs speed times faster while something sleeps on it.
+
+    Sleeps take seconds / speed (no time at speed 0) and move the clock far
+    enough forward that the sleeper sees its full wait as elapsed, so
+    recorded flood and slow mode waits keep their effect on the engine.
+    """
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.skipped = 0.0
+
+    def time(self):
+        return time.time() + self.skipped
+
+    async def sleep(self, seconds):
+        wake_at = self.time() + max(seconds, 0)
+        await asyncio.sleep(seconds / self.speed if self.speed and seconds > 0 else 0)
+        self.skipped = max(self.skipped, wake_at - time.time())
+
+async def replay(path, speed):
+    """Run a broadcast over replayed clients and print how the engine performed"""
+    from session_manager import SessionManager
+    from broadcast import BroadcastManager
+
+    session_manager = SessionManager()
+    # Keep the real sessions.json untouched
+    async def save_session_data():
+        pass
+    session_manager.save_session_data = save_session_data
+    clients = {phone_number: ReplayClient(events, speed) for phone_number, events in load_recording(path).items()}
+    session_manager.sessions.update(clients)
+    clock = ScaledClock(speed)
+    broadcast_manager = BroadcastManager(session_manager, clock=clock.time, sleep=clock.sleep)
+
+    start = time.monotonic()
+    results = await broadcast_manager.broadcast_to_groups("Replayed broadcast")
+    elapsed = time.monotonic() - start
+
+    for phone_number, result in results.items():
+        if result.error:
+            print(f"{phone_number}: error - {result.error}")
+            continue
+        print(f"{phone_number}: {result.success} sent, {result.failed} failed, {clients[phone_number].calls} calls")
+        if result.histogram:
+            print(f"   {result.describe_histogram()}")
+    print(f"Replayed in {elapsed:.2f}s at {speed}x speed")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded broadcast run offline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay", help="Replay a recording through the send engine")
+    replay_parser.add_argument("path", help="Recording file written with RECORD_DIR set")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="Speed-up factor for latencies and waits, 0 skips them")
+    args = parser.parse_args(argv)
+    asyncio.run(replay(args.path, args.speed))
+
+if __name__ == "__main__":
+    sys.exit(main())
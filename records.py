@@ -0,0 +1,124 @@
+import enum
+import time
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+from pyrogram.errors import (
+    FloodWait, SlowmodeWait, PeerFlood, UserPrivacyRestricted, ChatWriteForbidden,
+    ChatAdminRequired, ChatRestricted, UserBannedInChannel, ChannelPrivate
+)
+
+@dataclass(slots=True)
+class GroupInfo:
+    """Compact description of a group an account is in"""
+    id: int
+    title: str
+    type: str
+    username: Optional[str] = None
+    member_count: Optional[int] = None
+    is_admin: bool = False
+    can_send_messages: bool = True
+    muted_until: int = 0  # epoch seconds notifications stay off, from the dialog notify settings
+    slow_mode_delay: int = 0  # seconds between posts, learned from slow mode errors
+    last_post_at: float = 0.0  # epoch seconds of the last successful post
+
+    @property
+    def ready_at(self):
+        """Epoch time the chat accepts a new post"""
+        return self.last_post_at + self.slow_mode_delay
+
+    @property
+    def muted(self):
+        return self.muted_until > time.time()
+
+    @property
+    def notifications(self):
+        return "disabled" if self.muted else "enabled"
+
+    def carry_over(self, previous):
+        """Keep cooldown state learned by an earlier record of the same chat"""
+        self.slow_mode_delay = max(self.slow_mode_delay, previous.slow_mode_delay)
+        self.last_post_at = max(self.last_post_at, previous.last_post_at)
+
+class SendError(enum.IntEnum):
+    """Why sending to (or leaving) a chat failed"""
+    CANNOT_SEND = 1
+    FLOOD_WAIT = 2
+    SLOW_MODE = 3
+    PEER_FLOOD = 4
+    PRIVACY_RESTRICTED = 5
+    WRITE_FORBIDDEN = 6
+    ADMIN_REQUIRED = 7
+    RESTRICTED = 8
+    BANNED = 9
+    PRIVATE = 10
+    OTHER = 11
+
+    @property
+    def label(self):
+        return self.name.replace("_", " ").capitalize()
+
+    @classmethod
+    def classify(cls, error):
+        """Map an exception to an error class"""
+        for error_type, error_class in _ERROR_CLASSES:
+            if isinstance(error, error_type):
+                return error_class
+        return cls.OTHER
+
+_ERROR_CLASSES = (
+    (FloodWait, SendError.FLOOD_WAIT),
+    (SlowmodeWait, SendError.SLOW_MODE),
+    (PeerFlood, SendError.PEER_FLOOD),
+    (UserPrivacyRestricted, SendError.PRIVACY_RESTRICTED),
+    (ChatWriteForbidden, SendError.WRITE_FORBIDDEN),
+    (ChatAdminRequired, SendError.ADMIN_REQUIRED),
+    (ChatRestricted, SendError.RESTRICTED),
+    (UserBannedInChannel, SendError.BANNED),
+    (ChannelPrivate, SendError.PRIVATE),
+)
+
+class AccountResult:
+    """Outcome counters for one account, failures are kept as (error class, chat id) arrays"""
+    __slots__ = ("success", "failed", "error", "histogram", "failed_chats", "failed_codes")
+
+    def __init__(self):
+        self.success = 0
+        self.failed = 0
+        self.error = None  # set when the whole account failed
+        self.histogram = Counter()  # SendError -> count
+        self.failed_chats = array('q')
+        self.failed_codes = array('B')
+
+    def record_success(self):
+        self.success += 1
+
+    def record_failure(self, error_class, chat_id):
+        self.failed += 1
+        self.histogram[error_class] += 1
+        self.failed_chats.append(chat_id)
+        self.failed_codes.append(error_class)
+
+    def failures(self):
+        """Iterate over (SendError, chat_id) pairs"""
+        for code, chat_id in zip(self.failed_codes, self.failed_chats):
+            yield SendError(code), chat_id
+
+    def describe_failures(self, group_index, limit=3):
+        """Format the first failures, resolving chat titles from a group index"""
+        described = []
+        for error_class, chat_id in self.failures():
+            if len(described) >= limit:
+                break
+            group = group_index.get(chat_id)
+            title = group.title if group else str(chat_id)
+            described.append(f"{title}: {error_class.label}")
+        return described
+
+    def describe_histogram(self):
+        """Format failure counts per error class, most common first"""
+        return ", ".join(
+            f"{error_class.label} ×{count}"
+            for error_class, count in self.histogram.most_common()
+        )
@@ -0,0 +1,144 @@
+import io
+import itertools
+from collections import OrderedDict
+from pyrogram import enums
+from pyrogram.errors import MessageNotModified
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from config import REPORT_PAGE_LIMIT, REPORT_CACHE_SIZE
+
+def utf16_len(text):
+    """Length of text as Telegram counts it, in UTF-16 code units"""
+    return len(text.encode("utf-16-le")) // 2
+
+def _split_utf16(text, limit):
+    """Split off the longest prefix of text that fits in limit UTF-16 code units"""
+    size = 0
+    for position, char in enumerate(text):
+        size += 2 if ord(char) > 0xFFFF else 1
+        if size > limit:
+            return text[:position], text[position:]
+    return text, ""
+
+class ReportBuilder:
+    """Collects report lines and splits them into message-sized pages"""
+
+    def __init__(self, title, file_name="report.txt"):
+        self.title = title
+        self.file_name = file_name
+        self.lines = []
+
+    def add(self, line=""):
+        """Append a line to the report"""
+        self.lines.append(line)
+
+    def text(self):
+        """Get the whole report as one string"""
+        return "\n".join([self.title, ""] + self.lines)
+
+    def pages(self, limit=REPORT_PAGE_LIMIT):
+        """Split the report into pages of at most limit UTF-16 code units, breaking on lines"""
+        body_limit = limit - utf16_len(self.title) - 2
+        pages = []
+        current = []
+        size = 0
+        for line in self.lines:
+            length = utf16_len(line)
+            # Hard-split lines that could never fit on a page
+            while length > body_limit:
+                if current:
+                    pages.append(current)
+                    current, size = [], 0
+                head, line = _split_utf16(line, body_limit)
+                pages.append([head])
+                length = utf16_len(line)
+            if current and size + length + 1 > body_limit:
+                pages.append(current)
+                current, size = [], 0
+            current.append(line)
+            size += length + 1
+        if current or not pages:
+            pages.append(current)
+        return ["\n".join([self.title, ""] + page) for page in pages]
+
+    def as_file(self):
+        """Get the whole report as a plain text file for sending as a document"""
+        document = io.BytesIO(self.text().replace("**", "").encode("utf-8"))
+        document.name = self.file_name
+        return document
+
+class ReportManager:
+    """Keeps recently sent reports so their pages can be browsed with inline buttons"""
+
+    def __init__(self, max_reports=REPORT_CACHE_SIZE):
+        self.max_reports = max_reports
+        self.reports = OrderedDict()  # report_id -> (builder, pages)
+        self.ids = itertools.count(1)
+
+    def store(self, report, pages):
+        """Store a report and return its id, evicting the oldest ones"""
+        report_id = next(self.ids)
+        self.reports[report_id] = (report, pages)
+        while len(self.reports) > self.max_reports:
+            self.reports.popitem(last=False)
+        return report_id
+
+    def keyboard(self, report_id, page, total):
+        """Build the pagination keyboard for a page"""
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("◀️ Prev", callback_data=f"report:{report_id}:{page - 1}"))
+        navigation.append(InlineKeyboardButton(f"{page + 1}/{total}", callback_data=f"report:{report_id}:{page}"))
+        if page < total - 1:
+            navigation.append(InlineKeyboardButton("Next ▶️", callback_data=f"report:{report_id}:{page + 1}"))
+        return InlineKeyboardMarkup([
+            navigation,
+            [InlineKeyboardButton("📄 Full report", callback_data=f"report:{report_id}:file")]
+        ])
+
+    def _first_page(self, report):
+        """Get the first page of a report and its keyboard, None if it fits one page"""
+        pages = report.pages()
+        if len(pages) == 1:
+            return pages[0], None
+        report_id = self.store(report, pages)
+        return pages[0], self.keyboard(report_id, 0, len(pages))
+
+    async def send(self, message, report):
+        """Edit a message to show the first page of a report"""
+        page, keyboard = self._first_page(report)
+        await message.edit(page, parse_mode=enums.ParseMode.MARKDOWN, reply_markup=keyboard)
+
+    async def reply(self, message, report):
+        """Reply to a message with the first page of a report"""
+        page, keyboard = self._first_page(report)
+        await message.reply(page, parse_mode=enums.ParseMode.MARKDOWN, reply_markup=keyboard)
+
+    async def handle_callback(self, callback_query):
+        """Show another page of a report or send it as a file"""
+        _, report_id, target = callback_query.data.split(":")
+        stored = self.reports.get(int(report_id))
+        if stored is None:
+            await callback_query.answer("This report is no longer available.", show_alert=True)
+            return
+
+        report, pages = stored
+        if target == "file":
+            await callback_query.answer()
+            await callback_query.message.reply_document(report.as_file())
+            return
+
+        page = int(target)
+        if not 0 <= page < len(pages):
+            await callback_query.answer()
+            return
+
+        try:
+            await callback_query.message.edit_text(
+                pages[page],
+                parse_mode=enums.ParseMode.MARKDOWN,
+                reply_markup=self.keyboard(int(report_id), page, len(pages))
+            )
+        except MessageNotModified:
+            # The counter button points at the page already shown
+            pass
+        await callback_query.answer()
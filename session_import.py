@@ -0,0 +1,122 @@
+import asyncio
+from pathlib import Path
+from pyrogram import Client
+from pyrogram.storage import FileStorage
+from config import API_ID, API_HASH, SESSION_DIR, IMPORT_CONCURRENCY, IMPORT_TIMEOUT
+
+def parse_session_strings(content):
+    """Get the unique session strings of an uploaded file, one per line"""
+    session_strings = []
+    seen = set()
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or line in seen:
+            continue
+        seen.add(line)
+        session_strings.append(line)
+    return session_strings
+
+class SessionImporter:
+    """Adds accounts from exported pyrogram session strings"""
+
+    def __init__(self, session_manager, group_manager):
+        self.session_manager = session_manager
+        self.group_manager = group_manager
+        self.background_tasks = set()
+
+    async def _save_session_file(self, phone_number, client):
+        """Copy the authorization of an in-memory client into a session file"""
+        storage = FileStorage(phone_number, Path(SESSION_DIR))
+        await storage.open()
+        try:
+            await storage.dc_id(await client.storage.dc_id())
+            await storage.api_id(await client.storage.api_id())
+            await storage.test_mode(await client.storage.test_mode())
+            await storage.auth_key(await client.storage.auth_key())
+            await storage.date(await client.storage.date())
+            await storage.user_id(await client.storage.user_id())
+            await storage.is_bot(await client.storage.is_bot())
+            await storage.save()
+        finally:
+            await storage.close()
+
+    async def _validate(self, index, session_string):
+        """Connect a session string and return (phone_number, client)"""
+        client = Client(
+            f"import_{index}",
+            api_id=API_ID,
+            api_hash=API_HASH,
+            session_string=session_string
+        )
+        try:
+            # connect() instead of start(), which would prompt for a login
+            if not await client.connect():
+                raise ValueError("Session is not authorized")
+            me = await client.get_me()
+            if me.is_bot:
+                raise ValueError("Bot sessions cannot broadcast")
+            await client.initialize()
+        except Exception:
+            if client.is_connected:
+                await client.disconnect()
+            raise
+        return f"+{me.phone_number}" if me.phone_number else str(me.id), client
+
+    async def _import_one(self, index, session_string, semaphore):
+        async with semaphore:
+            try:
+                phone_number, client = await asyncio.wait_for(self._validate(index, session_string), IMPORT_TIMEOUT)
+            except asyncio.TimeoutError:
+                return None, None, "Timed out"
+            except Exception as e:
+                return None, None, str(e)
+
+            if self.session_manager.get_session(phone_number):
+                await client.stop()
+                return phone_number, None, "Already added"
+
+            try:
+                await self._save_session_file(phone_number, client)
+            except Exception as e:
+                await client.stop()
+                return phone_number, None, f"Could not save session: {e}"
+            return phone_number, client, None
+
+    def _schedule_indexing(self, clients):
+        """Build the group indexes of imported accounts without blocking the reply"""
+        async def index():
+            await asyncio.gather(*(
+                self.group_manager.index_groups(phone_number, client, save=False)
+                for phone_number, client in clients.items()
+            ))
+            await self.session_manager.save_session_data()
+        task = asyncio.create_task(index())
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def import_sessions(self, session_strings):
+        """Validate and start session strings concurrently and register the working ones.
+
+        Returns (imported phone numbers, list of (entry number, phone number or None, reason)).
+        """
+        semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+        outcomes = await asyncio.gather(*(
+            self._import_one(index, session_string, semaphore)
+            for index, session_string in enumerate(session_strings)
+        ))
+
+        clients = {}
+        failures = []
+        for entry_number, (phone_number, client, reason) in enumerate(outcomes, start=1):
+            if client is None:
+                failures.append((entry_number, phone_number, reason))
+            elif phone_number in clients:
+                await client.stop()
+                failures.append((entry_number, phone_number, "Duplicate account"))
+            else:
+                clients[phone_number] = client
+
+        if clients:
+            await self.session_manager.add_sessions(clients)
+            self._schedule_indexing(clients)
+        return list(clients), failures
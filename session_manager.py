@@ -1,16 +1,66 @@
 import os
 import json
+import time
+import heapq
 import asyncio
-from datetime import datetime, timedelta
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Optional
 from pyrogram import Client
 import aiofiles
-from config import SESSION_DIR, SESSION_EXPIRY_HOURS
+from config import (
+    API_ID, API_HASH, SESSION_DIR, SESSION_EXPIRY_HOURS, SESSION_STOP_TIMEOUT,
+    SESSION_START_CONCURRENCY, SESSION_START_TIMEOUT
+)
+
+SESSION_EXPIRY_SECONDS = SESSION_EXPIRY_HOURS * 3600
+
+def _to_epoch(value):
+    """Convert a stored timestamp (epoch or legacy ISO string) to epoch seconds"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(value).timestamp()
+
+def _format_time(timestamp):
+    """Format epoch seconds for display"""
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+@dataclass(slots=True)
+class SessionRecord:
+    """Metadata kept for every account, timestamps are epoch seconds"""
+    created_at: float
+    last_used: float
+    groups: int = 0
+    last_broadcast: Optional[float] = None
+
+    @property
+    def expires_at(self):
+        return self.last_used + SESSION_EXPIRY_SECONDS
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from saved data, accepting the old ISO format"""
+        return cls(
+            created_at=_to_epoch(data["created_at"]),
+            last_used=_to_epoch(data["last_used"]),
+            groups=data.get("groups", 0),
+            last_broadcast=_to_epoch(data.get("last_broadcast"))
+        )
+
+    def to_dict(self):
+        return asdict(self)
 
 class SessionManager:
     def __init__(self):
         self.sessions = {}
-        self.session_data = {}
-        self.ensure_session_dir()
+        self.session_data = {}  # phone_number -> SessionRecord
+        self.group_indexes = {}  # phone_number -> {chat_id: GroupInfo}
+        self.unhealthy = set()  # phone numbers kept out of rotation
+        self.revoked = set()  # phone numbers whose authorization was revoked
+        self.expiry_heap = []  # (expires_at, phone_number), may hold stale entries
+        self.status_cache = None
+        self.status_cache_valid_until = 0
+        self.expiry_changed = asyncio.Event()  # set when the earliest deadline moves forward
         
     def ensure_session_dir(self):
         """Ensure the session directory exists"""
@@ -19,12 +69,17 @@ class SessionManager:
             
     async def load_session_data(self):
         """Load session data from file"""
+        self.ensure_session_dir()
         try:
             if os.path.exists(f"{SESSION_DIR}/sessions.json"):
                 async with aiofiles.open(f"{SESSION_DIR}/sessions.json", 'r') as f:
                     content = await f.read()
                     if content:
-                        self.session_data = json.loads(content)
+                        self.session_data = {
+                            phone_number: SessionRecord.from_dict(data)
+                            for phone_number, data in json.loads(content).items()
+                        }
+                        self._rebuild_expiry_heap()
         except Exception as e:
             print(f"Error loading session data: {e}")
             
@@ -32,99 +87,302 @@ class SessionManager:
         """Save session data to file"""
         try:
             async with aiofiles.open(f"{SESSION_DIR}/sessions.json", 'w') as f:
-                await f.write(json.dumps(self.session_data))
+                await f.write(json.dumps({
+                    phone_number: record.to_dict()
+                    for phone_number, record in self.session_data.items()
+                }))
         except Exception as e:
             print(f"Error saving session data: {e}")
             
+    def _rebuild_expiry_heap(self):
+        """Rebuild the expiry heap from the current records"""
+        self.expiry_heap = [
+            (record.expires_at, phone_number)
+            for phone_number, record in self.session_data.items()
+        ]
+        heapq.heapify(self.expiry_heap)
+        self.expiry_changed.set()
+        self._invalidate_status()
+
+    def _schedule_expiry(self, phone_number):
+        """Push the current expiry of a session onto the heap"""
+        record = self.session_data[phone_number]
+        entry = (record.expires_at, phone_number)
+        heapq.heappush(self.expiry_heap, entry)
+        # Wake the sweeper only when this session is now the first to expire
+        if self.expiry_heap[0] == entry:
+            self.expiry_changed.set()
+        # Drop stale entries once they outnumber the live ones
+        if len(self.expiry_heap) > 2 * len(self.session_data) + 16:
+            self._rebuild_expiry_heap()
+        self._invalidate_status()
+
+    def _invalidate_status(self):
+        """Discard the cached status text"""
+        self.status_cache = None
+
+    def _is_current(self, entry):
+        """Check whether a heap entry still matches its session"""
+        expires_at, phone_number = entry
+        record = self.session_data.get(phone_number)
+        return record is not None and record.expires_at == expires_at
+
+    def next_expiry(self):
+        """Get the earliest session expiry time, or None if there are no sessions"""
+        while self.expiry_heap and not self._is_current(self.expiry_heap[0]):
+            heapq.heappop(self.expiry_heap)
+        return self.expiry_heap[0][0] if self.expiry_heap else None
+
+    def pop_expired_sessions(self, now=None):
+        """Pop phone numbers of expired sessions, looking only at entries that are due"""
+        now = time.time() if now is None else now
+        expired = []
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            entry = heapq.heappop(self.expiry_heap)
+            if self._is_current(entry):
+                expired.append(entry[1])
+        return expired
+
+    async def add_sessions(self, clients):
+        """Add several sessions with a single metadata write"""
+        now = time.time()
+        for phone_number, client in clients.items():
+            self.sessions[phone_number] = client
+            self.session_data[phone_number] = SessionRecord(created_at=now, last_used=now)
+            self._schedule_expiry(phone_number)
+        await self.save_session_data()
+        
     async def add_session(self, phone_number, client):
         """Add a new session"""
-        self.sessions[phone_number] = client
-        self.session_data[phone_number] = {
-            "created_at": datetime.now().isoformat(),
-            "last_used": datetime.now().isoformat(),
-            "groups": 0,
-            "last_broadcast": None
-        }
-        await self.save_session_data()
+        await self.add_sessions({phone_number: client})
         
-    async def remove_session(self, phone_number):
-        """Remove a session"""
-        if phone_number in self.sessions:
+    async def _stop_clients(self, clients):
+        """Stop clients concurrently, giving each at most SESSION_STOP_TIMEOUT seconds"""
+        async def stop(client):
             try:
-                await self.sessions[phone_number].stop()
-            except:
+                # Clients from /otp and /password are connected but never initialized,
+                # and stop() refuses those without closing the connection
+                if getattr(client, 'is_initialized', True):
+                    await asyncio.wait_for(client.stop(), SESSION_STOP_TIMEOUT)
+                elif client.is_connected:
+                    await asyncio.wait_for(client.disconnect(), SESSION_STOP_TIMEOUT)
+            except Exception:
                 pass
-            del self.sessions[phone_number]
+        await asyncio.gather(*(stop(client) for client in clients))
+
+    def _create_saved_client(self, phone_number):
+        """Create the client of a saved session, None if its session file is gone"""
+        if not os.path.exists(f"{SESSION_DIR}/{phone_number}.session"):
+            return None
+        return Client(f"{SESSION_DIR}/{phone_number}", api_id=API_ID, api_hash=API_HASH)
+        
+    async def start_saved_sessions(self):
+        """Start the clients of saved, unexpired sessions that have a session file"""
+        semaphore = asyncio.Semaphore(SESSION_START_CONCURRENCY)
+        
+        def register(phone_number, client):
+            # The sweeper may have removed the session while it connected
+            if phone_number not in self.session_data or phone_number in self.sessions:
+                return False
+            self.sessions[phone_number] = client
+            return True
             
-        if phone_number in self.session_data:
-            # Remove session file if it exists
-            session_file = f"{SESSION_DIR}/{phone_number}.session"
-            if os.path.exists(session_file):
-                os.remove(session_file)
-            del self.session_data[phone_number]
+        async def start(phone_number):
+            client = self._create_saved_client(phone_number)
+            if client is None:
+                return
+            async with semaphore:
+                try:
+                    # connect() instead of start(), which would prompt for a login.
+                    # Pyrogram retries an unreachable datacenter forever, hence the timeout
+                    if not await asyncio.wait_for(client.connect(), SESSION_START_TIMEOUT):
+                        await client.disconnect()
+                        print(f"Session {phone_number} is no longer authorized")
+                        return
+                    await client.initialize()
+                    if not register(phone_number, client):
+                        await self._stop_clients([client])
+                except (asyncio.TimeoutError, OSError) as e:
+                    # Keep it out of rotation, the connection watchdog reconnects it
+                    print(f"Session {phone_number} could not connect, retrying later: {e!r}")
+                    if register(phone_number, client):
+                        self.mark_unhealthy(phone_number)
+                    else:
+                        await self._stop_clients([client])
+                except Exception as e:
+                    print(f"Error starting session {phone_number}: {e}")
+                    
+        now = time.time()
+        pending = [
+            phone_number for phone_number, record in self.session_data.items()
+            if phone_number not in self.sessions and record.expires_at > now
+        ]
+        await asyncio.gather(*(start(phone_number) for phone_number in pending))
+        
+    async def stop_all_clients(self):
+        """Stop every client without removing its session"""
+        await self._stop_clients(list(self.sessions.values()))
+        
+    async def remove_sessions(self, phone_numbers):
+        """Remove several sessions with a single metadata write"""
+        clients = [self.sessions.pop(p) for p in phone_numbers if p in self.sessions]
+        await self._stop_clients(clients)
+        for phone_number in phone_numbers:
+            self.group_indexes.pop(phone_number, None)
+            self.unhealthy.discard(phone_number)
+            self.revoked.discard(phone_number)
+            
+        for phone_number in phone_numbers:
+            if phone_number in self.session_data:
+                # Remove session file if it exists
+                session_file = f"{SESSION_DIR}/{phone_number}.session"
+                if os.path.exists(session_file):
+                    os.remove(session_file)
+                del self.session_data[phone_number]
+        self._invalidate_status()
             
         await self.save_session_data()
+
+    async def remove_session(self, phone_number):
+        """Remove a session"""
+        await self.remove_sessions([phone_number])
         
     async def clear_all_sessions(self):
         """Clear all sessions"""
-        phone_numbers = list(self.sessions.keys())
-        for phone_number in phone_numbers:
-            await self.remove_session(phone_number)
+        phone_numbers = list(self.sessions.keys() | self.session_data.keys())
+        await self.remove_sessions(phone_numbers)
             
     def get_session(self, phone_number):
         """Get a session by phone number"""
         return self.sessions.get(phone_number)
         
     def get_all_sessions(self):
-        """Get all active sessions"""
-        return self.sessions
+        """Get all active sessions that are known to be live"""
+        if not self.unhealthy:
+            return self.sessions
+        return {p: c for p, c in self.sessions.items() if p not in self.unhealthy}
+        
+    def mark_healthy(self, phone_number):
+        """Put a session back into rotation"""
+        if phone_number in self.unhealthy and phone_number not in self.revoked:
+            self.unhealthy.discard(phone_number)
+            self._invalidate_status()
+            
+    def mark_unhealthy(self, phone_number):
+        """Take a session out of rotation while it reconnects"""
+        if phone_number in self.sessions and phone_number not in self.unhealthy:
+            self.unhealthy.add(phone_number)
+            self._invalidate_status()
+            
+    async def mark_revoked(self, phone_number):
+        """Take a revoked session out of rotation for good and stop its client"""
+        if phone_number not in self.sessions:
+            return
+        self.unhealthy.add(phone_number)
+        self.revoked.add(phone_number)
+        self._invalidate_status()
+        await self._stop_clients([self.sessions[phone_number]])
+        
+    def get_group_index(self, phone_number):
+        """Get the known groups of a session keyed by chat id"""
+        return self.group_indexes.get(phone_number, {})
         
+    def set_group_index(self, phone_number, groups):
+        """Replace the known groups of a session, keeping learned cooldowns"""
+        previous = self.group_indexes.get(phone_number, {})
+        group_index = {}
+        for group in groups:
+            if group.id in previous:
+                group.carry_over(previous[group.id])
+            group_index[group.id] = group
+        if phone_number in self.sessions:
+            self.group_indexes[phone_number] = group_index
+        return group_index
+            
     def update_session_usage(self, phone_number):
         """Update last used timestamp for a session"""
         if phone_number in self.session_data:
-            self.session_data[phone_number]["last_used"] = datetime.now().isoformat()
+            self.session_data[phone_number].last_used = time.time()
+            self._schedule_expiry(phone_number)
             
-    async def update_session_groups(self, phone_number, count):
+    async def update_session_groups(self, phone_number, count, save=True):
         """Update group count for a session"""
         if phone_number in self.session_data:
-            self.session_data[phone_number]["groups"] = count
-            await self.save_session_data()
+            self.session_data[phone_number].groups = count
+            self._invalidate_status()
+            if save:
+                await self.save_session_data()
             
     def update_last_broadcast(self, phone_number):
         """Update last broadcast timestamp for a session"""
         if phone_number in self.session_data:
-            self.session_data[phone_number]["last_broadcast"] = datetime.now().isoformat()
+            self.session_data[phone_number].last_broadcast = time.time()
+            self._invalidate_status()
             
     def get_session_status(self):
         """Get status information for all sessions"""
+        now = time.time()
         status = {}
-        for phone_number, data in self.session_data.items():
-            # Check if session has expired
-            last_used = datetime.fromisoformat(data["last_used"])
-            expiry_time = last_used + timedelta(hours=SESSION_EXPIRY_HOURS)
-            expired = datetime.now() > expiry_time
-            
+        for phone_number, record in self.session_data.items():
             status[phone_number] = {
-                "groups": data["groups"],
-                "last_broadcast": data["last_broadcast"],
-                "expired": expired,
-                "expiry_time": expiry_time.isoformat()
+                "groups": record.groups,
+                "last_broadcast": record.last_broadcast,
+                "expired": now > record.expires_at,
+                "expiry_time": record.expires_at
             }
         return status
+
+    def render_status(self):
+        """Get the session lines of the /status report, cached until a session changes"""
+        now = time.time()
+        if self.status_cache is not None and now < self.status_cache_valid_until:
+            return self.status_cache
+
+        # The lines stay valid until the next unexpired session crosses its deadline
+        valid_until = float("inf")
+        if not self.session_data:
+            lines = ["No active sessions."]
+        else:
+            lines = ["**Active Sessions:**"]
+            for phone_number, record in self.session_data.items():
+                if record.expires_at > now:
+                    valid_until = min(valid_until, record.expires_at)
+                last_broadcast = _format_time(record.last_broadcast) if record.last_broadcast else "Never"
+                lines.append(f"📱 {phone_number}")
+                lines.append(f"   📚 Groups: {record.groups}")
+                lines.append(f"   📢 Last Broadcast: {last_broadcast}")
+                lines.append(f"   ⏰ Expired: {'Yes' if now > record.expires_at else 'No'}")
+                if phone_number in self.revoked:
+                    lines.append("   🔌 Connection: Revoked")
+                elif phone_number in self.unhealthy:
+                    lines.append("   🔌 Connection: Reconnecting")
+                lines.append("")
+
+        self.status_cache = lines
+        self.status_cache_valid_until = valid_until
+        return lines
         
     async def cleanup_expired_sessions(self):
         """Remove expired sessions"""
-        current_time = datetime.now()
-        expired_sessions = []
-        
-        for phone_number, data in self.session_data.items():
-            last_used = datetime.fromisoformat(data["last_used"])
-            expiry_time = last_used + timedelta(hours=SESSION_EXPIRY_HOURS)
-            if current_time > expiry_time:
-                expired_sessions.append(phone_number)
-                
-        for phone_number in expired_sessions:
-            await self.remove_session(phone_number)
-            
+        expired_sessions = self.pop_expired_sessions()
         if expired_sessions:
-            await self.save_session_data()
+            await self.remove_sessions(expired_sessions)
+        return expired_sessions
+
+    async def run_expiry_sweeper(self):
+        """Remove sessions as they expire, sleeping until the next expiry deadline"""
+        while True:
+            self.expiry_changed.clear()
+            deadline = self.next_expiry()
+            timeout = None if deadline is None else max(0, deadline - time.time())
+            try:
+                await asyncio.wait_for(self.expiry_changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+                
+            try:
+                expired_sessions = await self.cleanup_expired_sessions()
+                if expired_sessions:
+                    print(f"Removed expired sessions: {', '.join(expired_sessions)}")
+            except Exception as e:
+                print(f"Error cleaning up expired sessions: {e}")
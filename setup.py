@@ -29,7 +29,7 @@ setup(
     install_requires=requirements,
     entry_points={
         "console_scripts": [
-            "telegram-broadcast-bot=main:main",
+            "telegram-broadcast-bot=main:cli",
         ],
     },
 )
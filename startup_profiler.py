@@ -0,0 +1,27 @@
+import time
+
+class StartupProfiler:
+    """Collects how long each startup phase took"""
+
+    def __init__(self, started):
+        self.started = started  # perf_counter() value when main.py began importing
+        self.phases = []  # (name, seconds)
+        self.ready_at = None
+
+    def record(self, name, started, finished=None):
+        """Record a phase that began at a perf_counter() value"""
+        finished = time.perf_counter() if finished is None else finished
+        self.phases.append((name, finished - started))
+
+    def mark_ready(self):
+        """Record that the bot can answer its first command"""
+        self.ready_at = time.perf_counter() - self.started
+
+    def report(self):
+        """Format the startup timings"""
+        lines = ["Startup profile:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:<14} {seconds * 1000:9.1f} ms")
+        if self.ready_at is not None:
+            lines.append(f"  {'first-command-ready':<14} {self.ready_at * 1000:9.1f} ms after import began")
+        return "\n".join(lines)
@@ -0,0 +1,49 @@
+import time
+import heapq
+from collections import deque
+
+class TargetQueue:
+    """Orders the target chats of one broadcast run by readiness.
+
+    Chats that can take a post now are sent to first, in dialog order.
+    Chats still cooling down from slow mode or a recent post are held in
+    a heap keyed by the time they become ready and handed out at the end.
+    """
+
+    def __init__(self, groups, now=None):
+        now = time.time() if now is None else now
+        self.ready = deque()
+        self.deferred = []  # (ready_at, chat_id)
+        for group in groups:
+            if group.ready_at <= now:
+                self.ready.append(group.id)
+            else:
+                self.deferred.append((group.ready_at, group.id))
+        heapq.heapify(self.deferred)
+
+    def __len__(self):
+        return len(self.ready) + len(self.deferred)
+
+    def defer(self, chat_id, ready_at):
+        """Push a chat back until it is ready again"""
+        heapq.heappush(self.deferred, (ready_at, chat_id))
+
+    def next_ready_at(self):
+        """Get the time the first deferred chat becomes ready, or None"""
+        return self.deferred[0][0] if self.deferred else None
+
+    def pop(self, now=None):
+        """Get the next chat to send to, or None if only cooling chats remain"""
+        if self.ready:
+            return self.ready.popleft()
+        now = time.time() if now is None else now
+        if self.deferred and self.deferred[0][0] <= now:
+            return heapq.heappop(self.deferred)[1]
+        return None
+
+    def drain(self):
+        """Remove and return every remaining chat id"""
+        chat_ids = list(self.ready) + [chat_id for _, chat_id in self.deferred]
+        self.ready.clear()
+        self.deferred.clear()
+        return chat_ids
@@ -1,14 +1,31 @@
 import asyncio
+import json
+import time
 import sys
 import os
 
 # Add the current directory to the path so we can import the bot modules
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from session_manager import SessionManager
+from session_manager import SessionManager, SessionRecord
 from otp_handler import OTPHandler
 from broadcast import BroadcastManager
 from group_utils import GroupManager
+from rate_limiter import RateLimiter
+from report import ReportBuilder, utf16_len
+from job_scheduler import PRIORITY_URGENT
+from connection_watchdog import ConnectionWatchdog
+from session_import import SessionImporter, parse_session_strings
+from recorder import Recorder, ReplayClient, ScaledClock, load_recording
+from startup_profiler import StartupProfiler
+import loadtest
+import tempfile
+from config import OWNER_ID
+from records import SendError, AccountResult, GroupInfo
+from types import SimpleNamespace
+from pyrogram import raw
+import dialogs
+from pyrogram.errors import ChatWriteForbidden, SlowmodeWait, AuthKeyUnregistered, PhoneCodeInvalid
 
 async def test_session_manager():
     """Test the session manager"""
@@ -16,6 +33,123 @@ async def test_session_manager():
     session_manager = SessionManager()
     print("SessionManager initialized successfully")
 
+async def test_session_expiry():
+    """Test session records, the expiry heap and the status cache"""
+    print("Testing session expiry...")
+    session_manager = SessionManager()
+    session_manager.save_session_data = lambda: asyncio.sleep(0)
+    await session_manager.add_session("+1", object())
+    await session_manager.add_session("+2", object())
+    status_text = session_manager.render_status()
+    assert session_manager.render_status() is status_text
+    assert session_manager.pop_expired_sessions() == []
+    session_manager.session_data["+1"].last_used -= 10 ** 6
+    session_manager._schedule_expiry("+1")
+    assert session_manager.next_expiry() < time.time()
+    assert session_manager.render_status() is not status_text
+    assert session_manager.pop_expired_sessions() == ["+1"]
+    assert session_manager.next_expiry() > time.time()
+    print("Session expiry works correctly")
+
+class FakeClient:
+    """Stand-in for a pyrogram client"""
+    def __init__(self):
+        self.stopped = False
+
+    async def stop(self):
+        self.stopped = True
+
+class FakeSignedInClient:
+    """Stand-in for a client from /otp, connected but never initialized"""
+    def __init__(self):
+        self.is_initialized = False
+        self.is_connected = True
+
+    async def stop(self):
+        raise ConnectionError("Client is already terminated")
+
+    async def disconnect(self):
+        self.is_connected = False
+
+async def test_stop_uninitialized():
+    """Test that removing or stopping sessions closes clients that were never initialized"""
+    print("Testing stopping uninitialized clients...")
+    session_manager = SessionManager()
+    session_manager.save_session_data = lambda: asyncio.sleep(0)
+    removed, kept = FakeSignedInClient(), FakeSignedInClient()
+    await session_manager.add_sessions({"+1": removed, "+2": kept})
+    await session_manager.remove_sessions(["+1"])
+    assert not removed.is_connected and kept.is_connected
+    await session_manager.stop_all_clients()
+    assert not kept.is_connected
+    print("Stopping uninitialized clients works correctly")
+
+class FakeSavedClient:
+    """Stand-in for a saved session client that takes a while to connect"""
+    def __init__(self):
+        self.is_initialized = False
+        self.is_connected = False
+        self.stopped = False
+
+    async def connect(self):
+        await asyncio.sleep(0.02)
+        self.is_connected = True
+        return True
+
+    async def initialize(self):
+        self.is_initialized = True
+
+    async def stop(self):
+        self.stopped = True
+
+async def test_start_saved_sessions():
+    """Test that boot skips expired sessions and drops ones removed while connecting"""
+    print("Testing saved session start...")
+    session_manager = SessionManager()
+    session_manager.save_session_data = lambda: asyncio.sleep(0)
+    now = time.time()
+    for phone_number, last_used in (("+1", now), ("+2", now - 25 * 3600), ("+3", now)):
+        session_manager.session_data[phone_number] = SessionRecord(created_at=now, last_used=last_used)
+    clients = {}
+    def create_saved_client(phone_number):
+        clients[phone_number] = FakeSavedClient()
+        return clients[phone_number]
+    session_manager._create_saved_client = create_saved_client
+    starting = asyncio.create_task(session_manager.start_saved_sessions())
+    await asyncio.sleep(0)
+    # The sweeper removes +3 while its client connects
+    del session_manager.session_data["+3"]
+    await starting
+    assert sorted(clients) == ["+1", "+3"]
+    assert list(session_manager.sessions) == ["+1"]
+    assert clients["+3"].stopped and not clients["+1"].stopped
+    print("Saved session start works correctly")
+
+async def test_expiry_sweeper():
+    """Test that the sweeper removes sessions at their deadline in one write"""
+    print("Testing expiry sweeper...")
+    session_manager = SessionManager()
+    saves = []
+    async def save_session_data():
+        saves.append(len(session_manager.session_data))
+    session_manager.save_session_data = save_session_data
+    clients = [FakeClient() for _ in range(3)]
+    for i, client in enumerate(clients):
+        await session_manager.add_session(f"+{i}", client)
+    sweeper = asyncio.create_task(session_manager.run_expiry_sweeper())
+    await asyncio.sleep(0)
+    last_used = time.time() - 24 * 3600 + 0.05
+    for i in range(2):
+        session_manager.session_data[f"+{i}"].last_used = last_used
+        session_manager._schedule_expiry(f"+{i}")
+    saves.clear()
+    await asyncio.sleep(0.2)
+    sweeper.cancel()
+    assert list(session_manager.session_data) == ["+2"]
+    assert [c.stopped for c in clients] == [True, True, False]
+    assert saves == [1]
+    print("Expiry sweeper works correctly")
+
 async def test_otp_handler():
     """Test the OTP handler"""
     print("Testing OTPHandler...")
@@ -23,6 +157,109 @@ async def test_otp_handler():
     otp_handler = OTPHandler(session_manager)
     print("OTPHandler initialized successfully")
 
+class FakeLoginClient:
+    """Stand-in for a temporary login client"""
+    def __init__(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+async def test_pending_logins():
+    """Test concurrent pending logins and their expiry"""
+    print("Testing pending logins...")
+    otp_handler = OTPHandler(SessionManager())
+    otp_handler.pending_logins.ttl = 0.05
+    first, second = FakeLoginClient(), FakeLoginClient()
+    otp_handler.pending_logins["+1"] = {"client": first, "phone_code_hash": "a"}
+    assert otp_handler.resolve_phone("12345") == ("+1", "12345")
+    assert otp_handler.resolve_phone("+15550001111 12345") == (None, None)
+    assert otp_handler.resolve_phone("my pass") == ("+1", "my pass")
+    otp_handler.pending_logins["+2"] = {"client": second, "phone_code_hash": "b"}
+    assert otp_handler.resolve_phone("+2 my pass") == ("+2", "my pass")
+    assert otp_handler.resolve_phone("12345") == (None, None)
+    await asyncio.sleep(0.06)
+    assert await otp_handler.purge_expired_logins() == 2
+    assert not first.connected and not second.connected
+    assert not otp_handler.pending_logins
+    print("Pending logins work correctly")
+
+class FakeSignInClient(FakeLoginClient):
+    """Stand-in for a login client whose sign-in takes a while"""
+    async def sign_in(self, phone_number, phone_code_hash, phone_code):
+        await asyncio.sleep(0.1)
+        if phone_code != "12345":
+            raise PhoneCodeInvalid()
+        return SimpleNamespace(first_name="Test")
+
+    async def iter_groups(self):
+        return
+        yield
+
+async def test_login_during_purge():
+    """Test that a login being signed in survives the purger and a wrong code keeps it pending"""
+    print("Testing login during purge...")
+    session_manager = SessionManager()
+    session_manager.save_session_data = lambda: asyncio.sleep(0)
+    otp_handler = OTPHandler(session_manager)
+    otp_handler.pending_logins.ttl = 0.15
+    client = FakeSignInClient()
+    otp_handler.pending_logins["+1"] = {"client": client, "phone_code_hash": "a"}
+    success, _ = await otp_handler.verify_otp("+1", "00000")
+    assert not success and "+1" in otp_handler.pending_logins
+    # The login expires while the right code is being checked
+    verify = asyncio.create_task(otp_handler.verify_otp("+1", "12345"))
+    await asyncio.sleep(0.08)
+    assert await otp_handler.purge_expired_logins() == 0
+    success, response = await verify
+    assert success, response
+    assert client.connected and session_manager.get_session("+1") is client
+    assert "+1" not in otp_handler.pending_logins
+    await asyncio.gather(*otp_handler.background_tasks)
+    print("Login during purge works correctly")
+
+class FakeUserClient:
+    """Stand-in for a user account client with a fixed list of groups"""
+    def __init__(self, group_count, forbidden=(), slow_mode=(), muted=(), read_only=()):
+        self.groups = [
+            (-100 - i, f"Group {i}", -100 - i in muted, -100 - i in read_only)
+            for i in range(group_count)
+        ]
+        self.forbidden = set(forbidden)
+        self.slow_mode = set(slow_mode)
+        self.sent = []
+        self.texts = []
+        self.left = []
+
+    async def iter_groups(self):
+        for chat_id, title, muted, read_only in self.groups:
+            yield GroupInfo(
+                id=chat_id,
+                title=title,
+                type="supergroup",
+                can_send_messages=not read_only,
+                muted_until=2 ** 31 - 1 if muted else 0
+            )
+
+    async def get_chat_member(self, chat_id, user_id):
+        raise AssertionError("no per-chat member lookups expected")
+
+    async def leave_chat(self, chat_id):
+        self.left.append(chat_id)
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if chat_id in self.forbidden:
+            raise ChatWriteForbidden()
+        if chat_id in self.slow_mode:
+            self.slow_mode.discard(chat_id)
+            raise SlowmodeWait(value=0)
+        await asyncio.sleep(0)
+        self.sent.append(chat_id)
+        self.texts.append(text)
+
+    async def stop(self):
+        pass
+
 async def test_broadcast_manager():
     """Test the broadcast manager"""
     print("Testing BroadcastManager...")
@@ -30,6 +267,150 @@ async def test_broadcast_manager():
     broadcast_manager = BroadcastManager(session_manager)
     print("BroadcastManager initialized successfully")
 
+async def test_broadcast_results():
+    """Test that broadcast outcomes are aggregated into compact results"""
+    print("Testing broadcast results...")
+    session_manager = SessionManager()
+    session_manager.save_session_data = lambda: asyncio.sleep(0)
+    client = FakeUserClient(5, forbidden={-101, -103})
+    await session_manager.add_session("+1", client)
+    broadcast_manager = BroadcastManager(session_manager)
+    results = await broadcast_manager.broadcast_to_groups("hello")
+    result = results["+1"]
+    assert isinstance(result, AccountResult)
+    assert (result.success, result.failed, result.error) == (3, 2, None)
+    assert result.histogram[SendError.WRITE_FORBIDDEN] == 2
+    group_index = session_manager.get_group_index("+1")
+    assert isinstance(group_index[-101], GroupInfo) and group_index[-101].type == "supergroup"
+    assert result.describe_failures(group_index) == ["Group 1: Write forbidden", "Group 3: Write forbidden"]
+    assert result.describe_failures({}, limit=1) == ["-101: Write forbidden"]
+    print("Broadcast results work correctly")
+
+async def test_usage_saved():
+    """Test that broadcasts and /left write the new usage times to disk"""
+    print("Testing usage persistence...")
+    session_manager = SessionManager()
+    saved = []
+    async def save_session_data():
+        saved.append(session_manager.session_data["+1"].last_used)
+    session_manager.save_session_data = save_session_data
+    await session_manager.add_session("+1", FakeUserClient(2))
+    for run in (BroadcastManager(session_manager).broadcast_to_groups("hello"), GroupManager(session_manager).leave_muted_groups()):
+        session_manager.session_data["+1"].last_used = time.time() - 23 * 3600
+        saved.clear()
+        await run
+        assert saved and time.time() - saved[-1] < 60
+    print("Usage persistence works correctly")
+
+async def test_cooldown_ordering():
+    """Test that chats in cooldown are deferred to the end of a run"""
+    print("Testing cooldown ordering...")
+    session_manager = SessionManager()
+    session_manager.save_session_data = lambda: asyncio.sleep(0)
+    client = FakeUserClient(5, slow_mode={-102})
+    await session_manager.add_session("+1", client)
+    cooling = GroupInfo(id=-100, title="Group 0", type="supergroup", slow_mode_delay=60)
+    cooling.last_post_at = time.time() - 60 + 0.05
+    session_manager.set_group_index("+1", [cooling])
+    broadcast_manager = BroadcastManager(session_manager)
+    result = (await broadcast_manager.broadcast_to_groups("hello"))["+1"]
+    assert (result.success, result.failed) == (5, 0)
+    assert client.sent == [-101, -103, -104, -102, -100]
+    assert session_manager.get_group_index("+1")[-100].slow_mode_delay == 60
+    print("Cooldown ordering works correctly")
+
+async def test_job_scheduler():
+    """Test fair sharing and pre-emption between concurrent broadcasts"""
+    print("Testing job scheduler...")
+    session_manager = SessionManager()
+    session_manager.save_session_data = lambda: asyncio.sleep(0)
+    client = FakeUserClient(4)
+    await session_manager.add_session("+1", client)
+    scheduler = BroadcastManager(session_manager).scheduler
+    
+    first = scheduler.submit("a")
+    second = scheduler.submit("b")
+    await asyncio.gather(first.done, second.done)
+    assert client.texts == ["a", "b"] * 4
+    
+    client.texts.clear()
+    routine = scheduler.submit("r")
+    while not client.texts:
+        await asyncio.sleep(0)
+    urgent = scheduler.submit("u", priority=PRIORITY_URGENT)
+    assert scheduler.get_stats()["queue_depth"] == {"+1": 2}
+    await asyncio.gather(routine.done, urgent.done)
+    # The urgent job takes over at the next chat and runs uninterrupted
+    first_urgent = client.texts.index("u")
+    assert client.texts[first_urgent:first_urgent + 4] == ["u"] * 4
+    assert client.texts[-1] == "r" and client.texts.count("r") == 4
+    assert urgent.results["+1"].success == 4
+    assert scheduler.get_stats()["jobs"] == []
+
+    # A worker that crashes still finishes the jobs queued on it
+    async def deliver(client, run, chat_id):
+        raise RuntimeError("boom")
+    scheduler.broadcast_manager.deliver = deliver
+    first = scheduler.submit("a")
+    second = scheduler.submit("b")
+    await asyncio.wait_for(asyncio.gather(first.done, second.done), 5)
+    assert "boom" in first.results["+1"].error and "boom" in second.results["+1"].error
+    assert scheduler.workers == {} and scheduler.get_stats()["jobs"] == []
+    print("Job scheduler works correctly")
+
+async def test_record_and_replay():
+    """Test that a recorded broadcast replays with the same outcomes"""
+    print("Testing record and replay...")
+    session_manager = SessionManager()
+    session_manager.save_session_data = lambda: asyncio.sleep(0)
+    await session_manager.add_session("+1", FakeUserClient(6, forbidden={-101}, slow_mode={-103}))
+    broadcast_manager = BroadcastManager(session_manager)
+    with tempfile.TemporaryDirectory() as record_dir:
+        broadcast_manager.recorder = Recorder(record_dir)
+        recorded = (await broadcast_manager.broadcast_to_groups("hello"))["+1"]
+        broadcast_manager.recorder.close()
+        events = load_recording(broadcast_manager.recorder.path)
+        
+    replay_manager = SessionManager()
+    client = ReplayClient(events["+1"], speed=0)
+    replay_manager.sessions["+1"] = client
+    replayed = (await BroadcastManager(replay_manager).broadcast_to_groups("hello"))["+1"]
+    assert (replayed.success, replayed.failed) == (recorded.success, recorded.failed) == (5, 1)
+    assert replayed.histogram == recorded.histogram
+    assert replay_manager.get_group_index("+1")[-103].slow_mode_delay == 0
+    assert client.calls == 1 + 7
+    print("Record and replay works correctly")
+
+async def test_replay_skips_waits():
+    """Test that recorded flood and slow mode waits don't take wall-clock time at speed 0"""
+    print("Testing replay speed...")
+    events = [
+        {"op": "groups", "acct": "+1", "lat": 0, "chats": [
+            [-100, "Group 0", "supergroup", None, False, True, 0],
+            [-101, "Group 1", "supergroup", None, False, True, 0]
+        ]},
+        {"op": "send", "acct": "+1", "chat": -100, "lat": 0, "err": "FloodWait", "val": 3},
+        {"op": "send", "acct": "+1", "chat": -100, "lat": 0},
+        {"op": "send", "acct": "+1", "chat": -101, "lat": 0, "err": "SlowmodeWait", "val": 5},
+        {"op": "send", "acct": "+1", "chat": -101, "lat": 0}
+    ]
+    with tempfile.TemporaryDirectory() as record_dir:
+        path = os.path.join(record_dir, "recording.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(json.dumps(event) for event in events))
+        clients = {phone_number: ReplayClient(account_events, speed=0) for phone_number, account_events in load_recording(path).items()}
+        
+    replay_manager = SessionManager()
+    replay_manager.sessions.update(clients)
+    clock = ScaledClock(0)
+    started = time.monotonic()
+    result = (await BroadcastManager(replay_manager, clock=clock.time, sleep=clock.sleep).broadcast_to_groups("hello"))["+1"]
+    assert time.monotonic() - started < 1
+    assert (result.success, result.failed) == (2, 0)
+    assert clients["+1"].calls == 1 + 4
+    assert clock.time() - time.time() >= 5
+    print("Replay speed works correctly")
+
 async def test_group_manager():
     """Test the group manager"""
     print("Testing GroupManager...")
@@ -37,15 +418,287 @@ async def test_group_manager():
     group_manager = GroupManager(session_manager)
     print("GroupManager initialized successfully")
 
+class FakeDialogsClient:
+    """Stand-in for a pyrogram client answering raw GetDialogs with two pages"""
+    def __init__(self):
+        self.requests = []
+        self.counted = []
+
+    def iter_groups(self):
+        return dialogs._iter_raw_groups(self)
+
+    async def get_chat_members_count(self, chat_id):
+        self.counted.append(chat_id)
+        return 40
+
+    async def invoke(self, query, sleep_threshold=None):
+        self.requests.append(query)
+        muted = raw.types.PeerNotifySettings(mute_until=2 ** 31 - 1)
+        if not query.offset_id:
+            dialogs = [
+                raw.types.Dialog(peer=raw.types.PeerChannel(channel_id=1), top_message=10, read_inbox_max_id=0,
+                                 read_outbox_max_id=0, unread_count=0, unread_mentions_count=0,
+                                 unread_reactions_count=0, notify_settings=muted),
+                raw.types.Dialog(peer=raw.types.PeerChannel(channel_id=2), top_message=20, read_inbox_max_id=0,
+                                 read_outbox_max_id=0, unread_count=0, unread_mentions_count=0,
+                                 unread_reactions_count=0, notify_settings=raw.types.PeerNotifySettings())
+            ]
+            chats = [
+                raw.types.Channel(id=1, title="Muted", photo=raw.types.ChatPhotoEmpty(), date=0,
+                                  megagroup=True, access_hash=11),
+                raw.types.Channel(id=2, title="News", photo=raw.types.ChatPhotoEmpty(), date=0,
+                                  broadcast=True, access_hash=22)
+            ]
+            messages = [raw.types.Message(id=20, peer_id=raw.types.PeerChannel(channel_id=2), date=500, message="")]
+            return raw.types.messages.DialogsSlice(count=3, dialogs=dialogs, messages=messages, chats=chats, users=[])
+        assert query.offset_peer.access_hash == 22 and query.offset_date == 500
+        read_only = raw.types.ChatBannedRights(until_date=0, send_messages=True)
+        dialogs = [
+            raw.types.Dialog(peer=raw.types.PeerChat(chat_id=3), top_message=30, read_inbox_max_id=0,
+                             read_outbox_max_id=0, unread_count=0, unread_mentions_count=0,
+                             unread_reactions_count=0, notify_settings=raw.types.PeerNotifySettings(mute_until=1))
+        ]
+        chats = [
+            raw.types.Chat(id=3, title="Read only", photo=raw.types.ChatPhotoEmpty(), participants_count=5,
+                           date=0, version=1, default_banned_rights=read_only)
+        ]
+        return raw.types.messages.DialogsSlice(count=3, dialogs=dialogs, messages=[], chats=chats, users=[])
+
+async def test_muted_groups():
+    """Test that mute state comes from dialog pages and /left needs no per-chat lookups"""
+    print("Testing muted group detection...")
+    client = FakeDialogsClient()
+    groups = [group async for group in dialogs._iter_raw_groups(client)]
+    assert len(client.requests) == 2
+    assert [(group.id, group.type, group.muted, group.can_send_messages, group.member_count) for group in groups] == [
+        (-1000000000001, "supergroup", True, True, None),
+        (-3, "group", False, False, 5)
+    ]
+    # Member counts are only looked up when the dialog page lacked them
+    statuses = await GroupManager(SessionManager()).get_group_status(FakeDialogsClient())
+    assert [group.member_count for group in statuses] == [40, 5]
+    client = FakeDialogsClient()
+    await BroadcastManager(SessionManager()).get_group_list(client)
+    assert client.counted == [-1000000000001]
+    
+    session_manager = SessionManager()
+    session_manager.save_session_data = lambda: asyncio.sleep(0)
+    user_client = FakeUserClient(4, muted={-101}, read_only={-102})
+    await session_manager.add_session("+1", user_client)
+    group_manager = GroupManager(session_manager)
+    statuses = await group_manager.get_group_status(user_client, "+1")
+    assert [group.notifications for group in statuses] == ["enabled", "disabled", "enabled", "enabled"]
+    assert session_manager.get_group_index("+1")[-101].muted
+    result = (await group_manager.leave_muted_groups())["+1"]
+    assert (result.success, result.failed) == (2, 0)
+    assert user_client.left == [-101, -102]
+    assert sorted(session_manager.get_group_index("+1")) == [-103, -100]
+    print("Muted group detection works correctly")
+
+class FakeConnection:
+    """Stand-in for a started client whose connection can drop or be revoked"""
+    def __init__(self, state="live"):
+        self.state = state
+        self.is_initialized = True
+        self.is_connected = True
+        self.restarts = 0
+
+    async def invoke(self, query):
+        if self.state == "revoked":
+            raise AuthKeyUnregistered()
+        if self.state == "dropped":
+            raise ConnectionError("Connection lost")
+
+    async def stop(self):
+        self.is_initialized = self.is_connected = False
+
+    async def connect(self):
+        self.is_connected = True
+        self.restarts += 1
+        self.state = "live"
+        return True
+
+    async def initialize(self):
+        self.is_initialized = True
+
+async def test_connection_watchdog():
+    """Test that the watchdog reconnects dropped clients and retires revoked ones"""
+    print("Testing connection watchdog...")
+    session_manager = SessionManager()
+    session_manager.save_session_data = lambda: asyncio.sleep(0)
+    clients = {"+1": FakeConnection(), "+2": FakeConnection("dropped"), "+3": FakeConnection("revoked")}
+    for phone_number, client in clients.items():
+        await session_manager.add_session(phone_number, client)
+    watchdog = ConnectionWatchdog(session_manager)
+    await watchdog.check_all()
+    assert set(session_manager.get_all_sessions()) <= {"+1", "+2"}
+    await asyncio.gather(*watchdog.reconnecting.values())
+    assert clients["+2"].restarts == 1
+    assert set(session_manager.get_all_sessions()) == {"+1", "+2"}
+    assert session_manager.revoked == {"+3"} and not clients["+3"].is_initialized
+    assert "   🔌 Connection: Revoked" in session_manager.render_status()
+    print("Connection watchdog works correctly")
+
+async def test_session_import():
+    """Test bulk import with capped concurrency and one metadata write"""
+    print("Testing session import...")
+    session_manager = SessionManager()
+    saves = []
+    async def save_session_data():
+        saves.append(len(session_manager.session_data))
+    session_manager.save_session_data = save_session_data
+    importer = SessionImporter(session_manager, GroupManager(session_manager))
+    
+    running = []
+    async def validate(index, session_string):
+        running.append(1)
+        assert len(running) <= 10
+        await asyncio.sleep(0.01)
+        running.pop()
+        if session_string == "bad":
+            raise ValueError("Session is not authorized")
+        return f"+{session_string}", FakeUserClient(3)
+    importer._validate = validate
+    importer._save_session_file = lambda phone_number, client: asyncio.sleep(0)
+    
+    session_strings = parse_session_strings("\n".join(["# exported", "bad", ""] + [str(i) for i in range(25)] + ["1"]))
+    assert len(session_strings) == 26
+    imported, failures = await importer.import_sessions(session_strings)
+    assert len(imported) == 25 and saves[0] == 25
+    assert failures == [(1, None, "Session is not authorized")]
+    await asyncio.gather(*importer.background_tasks)
+    assert session_manager.session_data["+7"].groups == 3
+    assert len(session_manager.get_group_index("+7")) == 3
+    assert len(saves) == 2
+    print("Session import works correctly")
+
+async def test_startup_profiler():
+    """Test the startup timing report"""
+    print("Testing StartupProfiler...")
+    started = time.perf_counter()
+    profiler = StartupProfiler(started)
+    profiler.record("import", started, started + 0.25)
+    profiler.record("session-load", time.perf_counter())
+    profiler.mark_ready()
+    report = profiler.report()
+    assert "import" in report and "250.0 ms" in report
+    assert "session-load" in report and "first-command-ready" in report
+    print("StartupProfiler works correctly")
+
+async def test_load_test():
+    """Test that the load test fakes drive the real decorated handlers"""
+    print("Testing load test...")
+    assert loadtest.percentile([0.1, 0.2, 0.3, 0.4], 0.5) == 0.2
+    assert loadtest.percentile([], 0.99) == 0.0
+    loadtest.bot.init_managers()
+    fake_bot = loadtest.FakeBot(0)
+    for user_id in (OWNER_ID + 1, OWNER_ID):
+        message = loadtest.SyntheticMessage(fake_bot, "/status", user_id, user_id)
+        message.command = ["status"]
+        await loadtest.bot.status_command(fake_bot, message)
+    # One rejection from is_owner and one status reply
+    assert fake_bot.calls == 2
+    print("Load test works correctly")
+
+class FakeCommand:
+    """Stand-in for an owner's command message that keeps the replies"""
+    def __init__(self, text):
+        self.text = text
+        self.command = text[1:].split()
+        self.from_user = SimpleNamespace(id=OWNER_ID)
+        self.chat = SimpleNamespace(id=OWNER_ID)
+        self.replies = []
+
+    async def reply(self, text, **kwargs):
+        self.replies.append((text, kwargs.get("reply_markup")))
+
+async def test_paged_reports():
+    """Test that /jobs and /status stay within one message per page with many accounts"""
+    print("Testing /jobs and /status reports...")
+    bot = loadtest.bot
+    bot.init_managers()
+    bot.session_manager.save_session_data = lambda: asyncio.sleep(0)
+    await bot.session_manager.add_sessions({f"+1555{i:07d}": FakeUserClient(1) for i in range(200)})
+    job = bot.broadcast_manager.scheduler.submit("hello")
+    message = FakeCommand("/jobs")
+    await bot.jobs_command(None, message)
+    text, keyboard = message.replies[0]
+    assert len(text) <= 4000 and keyboard is not None
+    assert "1 job(s): 200 account(s)" in text
+    await job.done
+    
+    message = FakeCommand("/status")
+    await bot.status_command(None, message)
+    text, keyboard = message.replies[0]
+    assert len(text) <= 4000 and keyboard is not None
+    assert text.startswith("**Bot Status**") and "⏱ Uptime" in text
+    print("/jobs and /status reports work correctly")
+
+async def test_rate_limiter():
+    """Test the rate limiter"""
+    print("Testing RateLimiter...")
+    now = [0.0]
+    limiter = RateLimiter(capacity=10, window=60, costs={"broadcast": 5}, clock=lambda: now[0])
+    assert limiter.consume(1, "broadcast")
+    assert limiter.consume(1, "broadcast")
+    assert not limiter.consume(1, "broadcast")
+    assert not limiter.consume(1, "status")
+    now[0] += 6
+    assert limiter.consume(1, "status")
+    now[0] += 120
+    assert limiter.consume(2, "status")
+    assert list(limiter.buckets) == [2]
+    print("RateLimiter works correctly")
+
+async def test_report_builder():
+    """Test splitting reports into pages"""
+    print("Testing ReportBuilder...")
+    report = ReportBuilder("**Results:**")
+    for i in range(2000):
+        report.add(f"📱 +{i}: ✅ Success: {i}")
+    report.add("x" * 10000)
+    # Emoji count twice towards Telegram's limit
+    for i in range(500):
+        report.add(f"📱📚📢 +{i}: ❌ " + "🚫" * (i % 40))
+    report.add("📢" * 5000)
+    pages = report.pages()
+    assert len(pages) > 1
+    assert all(utf16_len(page) <= 4000 and page.startswith("**Results:**") for page in pages)
+    assert sum(page.count("📱") for page in pages) == 2500
+    assert sum(page.count("📢") for page in pages) == 5500
+    assert utf16_len("📱a") == 3
+    assert report.as_file().read().decode("utf-8").startswith("Results:")
+    print("ReportBuilder works correctly")
+
 async def main():
     """Main test function"""
     print("Running bot tests...")
     
     try:
         await test_session_manager()
+        await test_session_expiry()
+        await test_stop_uninitialized()
+        await test_start_saved_sessions()
+        await test_expiry_sweeper()
         await test_otp_handler()
+        await test_pending_logins()
+        await test_login_during_purge()
         await test_broadcast_manager()
+        await test_broadcast_results()
+        await test_usage_saved()
+        await test_cooldown_ordering()
+        await test_job_scheduler()
+        await test_record_and_replay()
+        await test_replay_skips_waits()
         await test_group_manager()
+        await test_muted_groups()
+        await test_connection_watchdog()
+        await test_session_import()
+        await test_startup_profiler()
+        await test_load_test()
+        await test_paged_reports()
+        await test_rate_limiter()
+        await test_report_builder()
         
         print("All tests passed!")
     except Exception as e: